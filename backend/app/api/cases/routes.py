@@ -1,23 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime
 import uuid
-
-
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
-from reportlab.platypus import (
-    SimpleDocTemplate, 
-    Spacer, 
-    Table, 
-    TableStyle,
-    KeepTogether
-)
-from reportlab.platypus.para import Paragraph
-from reportlab.platypus.flowables import KeepTogether
 import os
-from ..content_verification.main import ContentVerification
+from ..content_verification.worker import enqueue_verification
+from ..rate_limit import rate_limit
 
 
 
@@ -27,6 +13,12 @@ def generate_case_pdf(case: dict) -> str:
     """
     Generate a minimal PDF report for a case
     """
+    # Imported here to keep ReportLab out of application startup
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Spacer
+    from reportlab.platypus.para import Paragraph
+
     os.makedirs(f'app/case_reports/{case["case_id"]}', exist_ok=True)
     pdf_filename = f'app/case_reports/{case["case_id"]}/case_{case["case_id"]}.pdf'
     
@@ -98,12 +90,20 @@ async def get_case(case_id: str):
         raise HTTPException(status_code=404, detail="Case not found")
     return case
 
+@router.get("/{case_id}/verification")
+async def get_case_verification(case_id: str):
+    """Reports progress and results of the case's content verification"""
+    verification = redis_client.get_verification_status(case_id)
+    if not verification:
+        raise HTTPException(status_code=404, detail="No verification found for this case")
+    return verification
+
 @router.get("/")
 async def list_cases():
     """Lists all cases"""
     return redis_client.list_cases()
 
-@router.post("/create")
+@router.post("/create", dependencies=[Depends(rate_limit("case_create"))])
 async def create_case(case_data: CaseCreateSchema):
     """Creates a new case with initial evidence"""
     try:
@@ -131,10 +131,6 @@ async def create_case(case_data: CaseCreateSchema):
         file_path = f'app/case_reports/{case_id}/content_verification/case.txt'
         reference_path = f'app/case_reports/{case_id}/content_verification/references'
 
-        content_verifier = ContentVerification(file_path, reference_path)
-        verification_results = content_verifier.verify_content(file_path, reference_path)
-        print(verification_results)
-
 
         case_obj = {
             "case_id": case_id,
@@ -166,6 +162,9 @@ async def create_case(case_data: CaseCreateSchema):
         saved_case = redis_client.create_case(case_id, case_obj)
         generate_case_pdf(case_obj)
         print(saved_case)
+
+        # Content verification runs in the background, see GET /{case_id}/verification
+        await enqueue_verification(case_id, file_path, reference_path)
         
         return saved_case
         
@@ -249,6 +248,7 @@ async def delete_case(case_id: str):
     try:
         # Delete case from Redis
         redis_client.delete_case(case_id)
+        redis_client.delete_verification_status(case_id)
         
         # Delete case files and directories
         case_dir = f'app/case_reports/{case_id}'
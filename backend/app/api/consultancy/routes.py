@@ -1,6 +1,8 @@
-from ...consultancy.consultancy import RAG
-from fastapi import APIRouter, Body
+from ...consultancy.consultancy import get_rag
+from fastapi import APIRouter, Body, Depends
 from pydantic import BaseModel
+from ..rate_limit import rate_limit
+import asyncio
 
 router = APIRouter()
 
@@ -8,9 +10,10 @@ router = APIRouter()
 class PromptRequest(BaseModel):
     prompt: str
 
-consultancyAgent = RAG()
-
-@router.post("/ask", response_model=str)
+@router.post("/ask", response_model=str, dependencies=[Depends(rate_limit("consultancy_ask"))])
 async def ask(request: PromptRequest):
     """Ask a question to the consultancy agent"""
-    return consultancyAgent.ask(request.prompt)
\ No newline at end of file
+    # The index is loaded on first use unless the startup warm-up already did it
+    consultancyAgent = await asyncio.to_thread(get_rag)
+    # Waiting for an LLM slot must not hold up the event loop
+    return await asyncio.to_thread(consultancyAgent.ask, request.prompt)
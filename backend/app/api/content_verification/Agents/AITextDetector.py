@@ -1,15 +1,18 @@
 import os
-from transformers import pipeline
+from ....ml.model_cache import get_pipeline
+
+DETECTOR_MODEL = "akshayvkt/detect-ai-text"
+EARLY_STOP = os.getenv("AI_DETECTION_EARLY_STOP", "false").lower() == "true"
+
+def AITextDetection(filepath, chunk_size=512, threshold=0.5, batch_size=16, early_stop=EARLY_STOP):
+    # Load the AI detection model (shared across calls)
+    detector = get_pipeline("text-classification", DETECTOR_MODEL)
 
-def AITextDetection(filepath, chunk_size=512, threshold=0.5):
-    # Load the AI detection model
-    detector = pipeline("text-classification", model="akshayvkt/detect-ai-text")
-    
     # Check if the output directory exists, if not, create it
     revisedFilepath = filepath[0:-9]
     output_dir = f'{revisedFilepath}/output'
     os.makedirs(output_dir, exist_ok=True)
-    
+
     try:
         # Read the content of the file
         with open(filepath, 'r', encoding='utf-8') as file:
@@ -19,44 +22,71 @@ def AITextDetection(filepath, chunk_size=512, threshold=0.5):
 
     # Split the text into chunks
     chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
-    
+
     ai_generated_count = 0
     human_written_count = 0
-    
-    # Process each chunk
-    for chunk in chunks:
-        result = detector(chunk)
-        
-        # Assuming result is in the format [{'label': 'AI', 'score': X}, {'label': 'Human', 'score': Y}]
-        if result[0]['label'] == 'AI':
-            ai_generated_count += 1
-        else:
-            human_written_count += 1
-    
-    # Calculate total chunks processed
+
+    # Calculate total chunks to process
     total_chunks = len(chunks)
-    
-    # Determine final classification based on threshold
+    if total_chunks == 0:
+        return "Error reading file: the file is empty"
+
+    # Classify the whole text in one batched call, or batch by batch when
+    # stopping early so the vote can be checked between batches
+    step = batch_size if early_stop else total_chunks
+    for start in range(0, total_chunks, step):
+        results = detector(chunks[start:start + step], batch_size=batch_size, truncation=True)
+
+        # Each result is the top label for its chunk, e.g. {'label': 'AI', 'score': X}
+        for result in results:
+            if result['label'] == 'AI':
+                ai_generated_count += 1
+            else:
+                human_written_count += 1
+
+        if early_stop:
+            remaining = total_chunks - ai_generated_count - human_written_count
+            # Stop once the remaining chunks can no longer flip the verdict
+            if ai_generated_count / total_chunks > threshold or (ai_generated_count + remaining) / total_chunks <= threshold:
+                break
+
+    classified_chunks = ai_generated_count + human_written_count
+    unclassified_chunks = total_chunks - classified_chunks
+
+    # Determine final classification based on threshold. Both use every chunk
+    # as the denominator; after an early stop the unclassified chunks could
+    # be either, so the percentage is only known to lie within a range.
     ai_percentage = ai_generated_count / total_chunks
-    
+    is_ai = ai_percentage > threshold
+
     # Prepare output message
-    if ai_percentage > threshold:
+    if is_ai:
         output_message = "The text is likely AI-generated."
     else:
         output_message = "The text is likely human-written."
-    
+
     # Write output to a file in the output directory
     output_filepath = os.path.join(output_dir, 'AITest.txt')
-    
+
     try:
         with open(output_filepath, 'w', encoding='utf-8') as output_file:
             output_file.write(output_message)
             output_file.write(f"\nAI-generated chunks: {ai_generated_count}\n")
             output_file.write(f"Human-written chunks: {human_written_count}\n")
             output_file.write(f"Total chunks: {total_chunks}\n")
-            output_file.write(f"AI percentage: {ai_percentage:.2%}\n")
-        
+            if unclassified_chunks:
+                output_file.write(
+                    f"Classification stopped early after {classified_chunks} of {total_chunks} chunks, "
+                    "once the remaining chunks could no longer change the verdict.\n"
+                )
+                output_file.write(
+                    f"AI percentage: between {ai_percentage:.2%} and {(ai_generated_count + unclassified_chunks) / total_chunks:.2%} "
+                    f"({unclassified_chunks} chunks not classified)\n"
+                )
+            else:
+                output_file.write(f"AI percentage: {ai_percentage:.2%}\n")
+
         return f"Output written to {output_filepath}"
-    
+
     except Exception as e:
-        return f"Error writing output file: {e}"
\ No newline at end of file
+        return f"Error writing output file: {e}"
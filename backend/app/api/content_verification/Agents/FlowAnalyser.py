@@ -1,18 +1,12 @@
 import os
-from phi.agent import Agent, RunResponse
-from phi.model.google import Gemini
+from phi.agent import RunResponse
+from ....llm.resilience import call_llm
 from phi.tools.file import FileTools
 from dotenv import load_dotenv
+from ..long_document import condense_document
 load_dotenv()
 
 def FlowAnalysis(filepath):
-    # Initialize the Analyzer agent with specified model and tools
-    Analyzer = Agent(
-        name="Analyzer",
-        model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")),
-        debug_mode=True
-    )
-
     # Check if the output directory exists, if not, create it
     revisedFilepath = filepath[0:-9]
     output_dir = f'{revisedFilepath}/output'
@@ -22,6 +16,9 @@ def FlowAnalysis(filepath):
         content = file.read()
     
     try:
+        # Long case files are analysed from their (cached) chunk summaries
+        content = condense_document(content)
+
         # Define the analysis prompt
         prompt = (
             "You are a senior legal analyst specializing in case assessment and quality control. "
@@ -81,7 +78,7 @@ def FlowAnalysis(filepath):
         )
 
         # Run the Analyzer agent with the analysis prompt
-        run: RunResponse = Analyzer.run(prompt)
+        run: RunResponse = call_llm("Analyzer", prompt, name="Analyzer", debug_mode=True)
         
         # Prepare output content
         analysis_content = run.content
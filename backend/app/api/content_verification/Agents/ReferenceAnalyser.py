@@ -1,18 +1,139 @@
 import os
-from phi.agent import Agent, RunResponse
-from phi.model.google import Gemini
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from phi.agent import RunResponse
+from ....llm.resilience import call_llm, propagate_deadline
 from phi.tools.file import FileTools
 from dotenv import load_dotenv
+from ..chunking import count_tokens, split_tokens
+from ....ml.embedding import get_embedding_service
 load_dotenv()
 
-def ReferenceAnalysis(filepath, references_dir):
-    # Initialize the Reference Analyzer agent with specified model and tools
-    ReferenceAnalyzer = Agent(
-        name="ReferenceAnalyzer",
-        model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")),
-        debug_mode = True
+# Token budget for the evidence placed in a single prompt
+EVIDENCE_TOKEN_BUDGET = int(os.getenv("EVIDENCE_TOKEN_BUDGET", "12000"))
+EVIDENCE_PASSAGE_TOKENS = int(os.getenv("EVIDENCE_PASSAGE_TOKENS", "300"))
+# Passages less similar than this to every part of the briefing are dropped
+EVIDENCE_MIN_SIMILARITY = float(os.getenv("EVIDENCE_MIN_SIMILARITY", "0.2"))
+# Upper bound on map calls when the relevant evidence does not fit in one prompt;
+# the least relevant passages beyond it are left out, and the report says so
+EVIDENCE_MAX_MAP_CALLS = int(os.getenv("EVIDENCE_MAX_MAP_CALLS", "4"))
+
+ANALYSIS_FRAMEWORK = (
+    "\nAnalysis Framework:"
+    "1. Document Authentication Assessment:"
+    "   - Verify document authenticity indicators"
+    "   - Evaluate chain of custody documentation"
+    "   - Review certification and notarization status"
+    "   - Assess document integrity and completeness"
+    "\n2. Case Briefing Analysis:"
+    "   - Map key claims and assertions"
+    "   - Identify material facts presented"
+    "   - Document critical dates and sequences"
+    "   - Log all stakeholder statements"
+    "   - Track referenced evidence citations"
+    "\n3. Evidence Cross-Verification Protocol:"
+    "   - Match evidence to specific claims"
+    "   - Evaluate supporting documentation strength"
+    "   - Identify contradictory evidence"
+    "   - Assess evidence reliability and credibility"
+    "   - Document chain of circumstantial connections"
+    "\n4. Sufficiency Analysis:"
+    "   - Evaluate evidence completeness for each claim"
+    "   - Identify documentation gaps"
+    "   - Assess quality of available evidence"
+    "   - Determine corroboration requirements"
+    "   - Review authentication needs"
+    "\nReport Structure Requirements:"
+    "1. Executive Overview:"
+    "   - Overall evidence sufficiency assessment"
+    "   - Critical findings summary"
+    "   - Major discrepancies identified"
+    "\n2. Claim-by-Claim Analysis:"
+    "   - Evidence mapping for each assertion"
+    "   - Support level classification"
+    "   - Contradiction documentation"
+    "   - Reliability assessment"
+    "\n3. Documentation Gaps:"
+    "   - Unsupported claims"
+    "   - Insufficient evidence areas"
+    "   - Missing authentication elements"
+    "   - Required additional documentation"
+    "\n4. Evidence Quality Assessment:"
+    "   - Document reliability ratings"
+    "   - Authentication status"
+    "   - Corroboration levels"
+    "   - Chain of custody verification"
+    "\n5. Action Requirements:"
+    "   - Additional evidence needs"
+    "   - Authentication requirements"
+    "   - Suggested verification steps"
+    "   - Risk mitigation recommendations"
+    "\nQuality Control Protocols:"
+    "- Implement double-verification for critical evidence"
+    "- Cross-reference all dates and sequences"
+    "- Verify all document citations"
+    "- Validate authentication credentials"
+    "- Review all chain of custody documentation"
+    "\nOutput Guidelines:"
+    "- Present findings in formal legal documentation style"
+    "- Include specific document references"
+    "- Provide evidence strength classifications"
+    "- Document all verification methodologies"
+    "- Include confidence levels for conclusions"
+)
+
+MAP_INSTRUCTIONS = (
+    "You are a forensic legal analyst specializing in evidence evaluation and case verification. "
+    "You are reviewing one batch of the evidentiary documents of a case; other batches are reviewed separately. "
+    "\nFor each claim in the case briefing, record which of the passages below support or contradict it, "
+    "quoting the exhibit name for each finding. Note any authenticity, chain of custody or completeness concerns. "
+    "Be concise and only report what these passages show."
+)
+
+def _retrieve_passages(case_briefing_content, passages):
+    """Ranks evidence passages by their best cosine similarity to any part of the briefing"""
+    embedder = get_embedding_service()
+    briefing_chunks = split_tokens(case_briefing_content, EVIDENCE_PASSAGE_TOKENS) or [case_briefing_content]
+
+    # Both lists go to the embedding worker at once and share its batches
+    query_future = embedder.submit(briefing_chunks)
+    passage_vectors = embedder.embed([text for _, text in passages])
+    query_vectors = query_future.result()
+
+    scores = (passage_vectors @ query_vectors.T).max(axis=1)
+    order = np.argsort(-scores)
+    return [passages[i] for i in order if scores[i] >= EVIDENCE_MIN_SIMILARITY]
+
+def _pack(passages, budget):
+    """Groups passages into batches of at most budget tokens"""
+    batches, current, size = [], [], 0
+    for name, text in passages:
+        tokens = count_tokens(text)
+        if current and size + tokens > budget:
+            batches.append(current)
+            current, size = [], 0
+        current.append((name, text))
+        size += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _format_evidence(passages):
+    return "\n\n".join(f"[Exhibit: {name}]\n{text}" for name, text in passages)
+
+def _analyse(prompt):
+    return call_llm("ReferenceAnalyzer", prompt, name="ReferenceAnalyzer", debug_mode=True)
+
+def _omission_note(omitted):
+    """Tells the reader of the report which evidence did not fit within EVIDENCE_MAX_MAP_CALLS"""
+    exhibits = sorted({name for name, _ in omitted})
+    return (
+        f"{len(omitted)} of the less relevant evidence passages ({sum(count_tokens(text) for _, text in omitted)} tokens, "
+        f"from {', '.join(exhibits)}) exceeded the limit of {EVIDENCE_MAX_MAP_CALLS} evidence batches "
+        "and were not analysed."
     )
 
+def ReferenceAnalysis(filepath, references_dir):
     # Check if the output directory exists, if not, create it
     revisedFilepath = filepath[0:-9]
     output_dir = f'{revisedFilepath}/output'
@@ -23,91 +144,60 @@ def ReferenceAnalysis(filepath, references_dir):
         with open(filepath, 'r', encoding='utf-8') as file:
             case_briefing_content = file.read()
 
-        # Gather all reference files in the specified directory
-        reference_files = [os.path.join(references_dir, f) for f in os.listdir(references_dir)]
-        
-        # Prepare a list to hold evidence content and their paths
-        evidence_contents = {}
-        
-        for ref_file in reference_files:
-            ref_path = ref_file
-            with open(ref_path, 'r', encoding='utf-8') as ref:
-                evidence_contents[ref_path] = ref.read()  # Store path and content
-        
+        # Split every reference file into passages
+        passages = []
+        for ref_file in sorted(os.listdir(references_dir)):
+            with open(os.path.join(references_dir, ref_file), 'r', encoding='utf-8') as ref:
+                for passage in split_tokens(ref.read(), EVIDENCE_PASSAGE_TOKENS):
+                    passages.append((ref_file, passage))
+
+        # Small evidence sets go in whole, larger ones are narrowed down to the
+        # passages relevant to the briefing
+        if sum(count_tokens(text) for _, text in passages) > EVIDENCE_TOKEN_BUDGET:
+            passages = _retrieve_passages(case_briefing_content, passages)
+        batches = _pack(passages, EVIDENCE_TOKEN_BUDGET) or [[]]
+        # Passages are ranked by relevance, so the batches past the cap hold the least relevant ones
+        omitted = [passage for batch in batches[EVIDENCE_MAX_MAP_CALLS:] for passage in batch]
+        batches = batches[:EVIDENCE_MAX_MAP_CALLS]
+        note = _omission_note(omitted) if omitted else ""
+        if note:
+            print(f"Reference analysis of {filepath}: {note}")
+
+        if len(batches) == 1:
+            evidence = _format_evidence(batches[0])
+        else:
+            # Map: analyse each batch of evidence on its own, all at once
+            map_prompts = [
+                f"{MAP_INSTRUCTIONS}"
+                f"\nPrimary Case Briefing:\n{case_briefing_content}"
+                f"\nEvidence passages:\n{_format_evidence(batch)}"
+                for batch in batches
+            ]
+            with ThreadPoolExecutor(max_workers=len(map_prompts)) as executor:
+                runs = list(executor.map(propagate_deadline(_analyse), map_prompts))
+            # Reduce: the final report is written from the per-batch findings
+            evidence = "\n\n".join(
+                f"Findings from evidence batch {idx}:\n{run.content}" for idx, run in enumerate(runs, 1)
+            )
+
         # Define the analysis prompt
+        coverage = f"\nCoverage: {note}" if note else ""
         prompt = (
             "You are a forensic legal analyst specializing in evidence evaluation and case verification. "
             "\nMaterials for Review:"
             f"Primary Case Briefing:\n{case_briefing_content}"
-            f"\nEvidentiary Documents:\n{evidence_contents}"
-            "\nAnalysis Framework:"
-            "1. Document Authentication Assessment:"
-            "   - Verify document authenticity indicators"
-            "   - Evaluate chain of custody documentation"
-            "   - Review certification and notarization status"
-            "   - Assess document integrity and completeness"
-            "\n2. Case Briefing Analysis:"
-            "   - Map key claims and assertions"
-            "   - Identify material facts presented"
-            "   - Document critical dates and sequences"
-            "   - Log all stakeholder statements"
-            "   - Track referenced evidence citations"
-            "\n3. Evidence Cross-Verification Protocol:"
-            "   - Match evidence to specific claims"
-            "   - Evaluate supporting documentation strength"
-            "   - Identify contradictory evidence"
-            "   - Assess evidence reliability and credibility"
-            "   - Document chain of circumstantial connections"
-            "\n4. Sufficiency Analysis:"
-            "   - Evaluate evidence completeness for each claim"
-            "   - Identify documentation gaps"
-            "   - Assess quality of available evidence"
-            "   - Determine corroboration requirements"
-            "   - Review authentication needs"
-            "\nReport Structure Requirements:"
-            "1. Executive Overview:"
-            "   - Overall evidence sufficiency assessment"
-            "   - Critical findings summary"
-            "   - Major discrepancies identified"
-            "\n2. Claim-by-Claim Analysis:"
-            "   - Evidence mapping for each assertion"
-            "   - Support level classification"
-            "   - Contradiction documentation"
-            "   - Reliability assessment"
-            "\n3. Documentation Gaps:"
-            "   - Unsupported claims"
-            "   - Insufficient evidence areas"
-            "   - Missing authentication elements"
-            "   - Required additional documentation"
-            "\n4. Evidence Quality Assessment:"
-            "   - Document reliability ratings"
-            "   - Authentication status"
-            "   - Corroboration levels"
-            "   - Chain of custody verification"
-            "\n5. Action Requirements:"
-            "   - Additional evidence needs"
-            "   - Authentication requirements"
-            "   - Suggested verification steps"
-            "   - Risk mitigation recommendations"
-            "\nQuality Control Protocols:"
-            "- Implement double-verification for critical evidence"
-            "- Cross-reference all dates and sequences"
-            "- Verify all document citations"
-            "- Validate authentication credentials"
-            "- Review all chain of custody documentation"
-            "\nOutput Guidelines:"
-            "- Present findings in formal legal documentation style"
-            "- Include specific document references"
-            "- Provide evidence strength classifications"
-            "- Document all verification methodologies"
-            "- Include confidence levels for conclusions"
+            f"\nEvidentiary Documents:\n{evidence}"
+            f"{coverage}"
+            f"{ANALYSIS_FRAMEWORK}"
         )
 
         # Run the Reference Analyzer agent with the analysis prompt
-        run: RunResponse = ReferenceAnalyzer.run(prompt)
+        run: RunResponse = _analyse(prompt)
         
         # Prepare output content
         analysis_report = run.content
+        if note:
+            analysis_report += f"\n\nNote: {note}"
         
         # Define output file path
         output_filepath = os.path.join(output_dir, 'References_Analysis_Report.txt')
@@ -1,19 +1,13 @@
 import os
-from phi.agent import Agent, RunResponse
-from phi.model.google import Gemini
+from phi.agent import RunResponse
+from ....llm.resilience import call_llm
 from phi.tools.file import FileTools
 
 from dotenv import load_dotenv
+from ..long_document import condense_document
 load_dotenv()
 
 def Summarize(filepath):
-    # Initialize the Summariser agent with specified model and tools
-    Summariser = Agent(
-        name="Summariser",
-        model = Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")),
-        debug_mode = True
-    )
-
     # Check if the output directory exists, if not, create it
     revisedFilepath = filepath[0:-9]
     output_dir = f'{revisedFilepath}/output'
@@ -23,6 +17,9 @@ def Summarize(filepath):
         content = file.read()
         
     try:
+        # Long case files are analysed from their (cached) chunk summaries
+        content = condense_document(content)
+
         # Define the refined prompt
         prompt = (
             "You are a professional content analyst specializing in legal and business document analysis. "
@@ -86,7 +83,8 @@ def Summarize(filepath):
         )
 
         # Run the Summariser agent with the refined prompt
-        run: RunResponse = Summariser.run(prompt)
+        # Identical documents submitted together are summarized once
+        run: RunResponse = call_llm("Summariser", prompt, single_flight=True, name="Summariser", debug_mode=True)
         
         # Prepare output content
         summary_content = run.content
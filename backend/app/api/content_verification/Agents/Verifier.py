@@ -1,17 +1,122 @@
 import os
-from phi.agent import Agent, RunResponse
-from phi.model.google import Gemini
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from pydantic import BaseModel, ValidationError
+from phi.agent import RunResponse
+from ....llm.resilience import call_llm, propagate_deadline
 from dotenv import load_dotenv
 load_dotenv()
 
-def Verify(filepath):
-    # Initialize the Verifier agent with specified model and tools
-    Verifier = Agent(
-        name="Verifier",
-        model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")),
-        tools=[]
-    )
+VERIFY_MODE = os.getenv("VERIFY_MODE", "batch")  # "batch" or "concurrent"
+VERIFY_MAX_CONCURRENCY = int(os.getenv("VERIFY_MAX_CONCURRENCY", "3"))
+# Reports are packed into as few requests as possible without exceeding this size
+VERIFY_MAX_BATCH_CHARS = int(os.getenv("VERIFY_MAX_BATCH_CHARS", "200000"))
 
+class FileVerdict(BaseModel):
+    filename: str
+    verdict: str  # "verified", "rejected" or "needs_review"
+    ai_content_percentage: Optional[float] = None
+    confidence: Optional[str] = None
+    rationale: str = ""
+
+class VerificationResult(BaseModel):
+    verdicts: List[FileVerdict]
+
+# Sent once per request, however many reports it carries
+VERIFICATION_INSTRUCTIONS = (
+    "You are a specialized legal verification analyst with expertise in authenticity assessment and AI-generated content detection. "
+    "\nAnalysis Framework:"
+    "1. Content Authentication Assessment:"
+    "   - Natural language patterns"
+    "   - Writing style consistency"
+    "   - Technical terminology usage"
+    "   - Document structure analysis"
+    "   - Citation patterns and formats"
+    "\n2. AI Content Detection Protocol:"
+    "   - Linguistic pattern analysis"
+    "   - Stylometric evaluation"
+    "   - Contextual coherence assessment"
+    "   - Technical indicator identification"
+    "   - Statistical pattern recognition"
+    "\n3. Verification Criteria:"
+    "   - Source authenticity indicators"
+    "   - Document integrity markers"
+    "   - Professional formatting standards"
+    "   - Legal terminology accuracy"
+    "   - Citation validity measures"
+    "\n4. Risk Assessment Parameters:"
+    "   - AI content percentage estimation"
+    "   - Authenticity confidence level"
+    "   - Quality assurance metrics"
+    "   - Professional standards compliance"
+    "   - Legal requirement adherence"
+    "\nQuality Control Measures:"
+    "- Multiple verification methods"
+    "- Cross-validation protocols"
+    "- Bias elimination procedures"
+    "- Standardized assessment criteria"
+    "\nDecision Criteria:"
+    "- Automatic rejection if AI content >20%"
+    "- Quality threshold requirements"
+    "- Professional standard compliance"
+    "- Legal requirement adherence"
+)
+
+OUTPUT_INSTRUCTIONS = (
+    "\nOutput Requirements:"
+    "\nAssess every document below independently. Respond with JSON only, no prose and no code fences, in exactly this shape:"
+    '\n{"verdicts": [{"filename": "<document name>", "verdict": "verified" | "rejected" | "needs_review", '
+    '"ai_content_percentage": <number 0-100>, "confidence": "low" | "medium" | "high", '
+    '"rationale": "<clear recommendation with supporting analysis, risk level and required follow-up actions>"}]}'
+    "\nInclude exactly one verdict per document, using the document name given."
+)
+
+def _build_prompt(documents):
+    parts = [VERIFICATION_INSTRUCTIONS, OUTPUT_INSTRUCTIONS, "\nDocuments for review:"]
+    for filename, content in documents:
+        parts.append(f'\n<document name="{filename}">\n{content}\n</document>')
+    return "".join(parts)
+
+def _parse_verdicts(content, filenames):
+    """Parses the model's JSON reply, marking files it did not answer for as needing review"""
+    match = re.search(r'\{.*\}', content, re.DOTALL)
+    verdicts = {}
+    if match:
+        try:
+            result = VerificationResult(**json.loads(match.group(0)))
+            verdicts = {verdict.filename: verdict for verdict in result.verdicts}
+        except (json.JSONDecodeError, ValidationError, TypeError) as e:
+            print(f"Could not parse verification response: {e}")
+
+    return [
+        verdicts.get(filename) or FileVerdict(
+            filename=filename,
+            verdict="needs_review",
+            rationale="No parseable verdict was returned for this document."
+        )
+        for filename in filenames
+    ]
+
+def _verify_documents(documents):
+    run: RunResponse = call_llm("Verifier", _build_prompt(documents), name="Verifier", tools=[])
+    return _parse_verdicts(run.content, [filename for filename, _ in documents])
+
+def _batch(documents, max_chars):
+    """Groups documents into as few requests as possible under max_chars"""
+    batches, current, size = [], [], 0
+    for document in documents:
+        if current and size + len(document[1]) > max_chars:
+            batches.append(current)
+            current, size = [], 0
+        current.append(document)
+        size += len(document[1])
+    if current:
+        batches.append(current)
+    return batches
+
+def Verify(filepath, mode=VERIFY_MODE, max_concurrency=VERIFY_MAX_CONCURRENCY):
     # Create a directory for verified reports if it doesn't exist
     revisedFilepath = filepath[0:-9]
     verified_dir = f'{revisedFilepath}/verified'
@@ -19,102 +124,41 @@ def Verify(filepath):
     os.makedirs(verified_dir, exist_ok=True)
 
     try:
-        # Prepare a report list
-        report_lines = []
-
-        # Iterate through all files in the output directory
-        for filename in os.listdir(output_dir):
+        # Read every report in the output directory
+        documents = []
+        for filename in sorted(os.listdir(output_dir)):
             if filename.endswith('.txt'):
-                file_path = os.path.join(output_dir, filename)
-
-                # Read the content of each file
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
-
-                # Define the prompt for verification
-                prompt = (
-                    "You are a specialized legal verification analyst with expertise in authenticity assessment and AI-generated content detection. "
-                    "\nDocument Details:"
-                    f"Case briefing for review: {content}"
-                    "\nAnalysis Framework:"
-                    "1. Content Authentication Assessment:"
-                    "   - Natural language patterns"
-                    "   - Writing style consistency"
-                    "   - Technical terminology usage"
-                    "   - Document structure analysis"
-                    "   - Citation patterns and formats"
-                    "\n2. AI Content Detection Protocol:"
-                    "   - Linguistic pattern analysis"
-                    "   - Stylometric evaluation"
-                    "   - Contextual coherence assessment"
-                    "   - Technical indicator identification"
-                    "   - Statistical pattern recognition"
-                    "\n3. Verification Criteria:"
-                    "   - Source authenticity indicators"
-                    "   - Document integrity markers"
-                    "   - Professional formatting standards"
-                    "   - Legal terminology accuracy"
-                    "   - Citation validity measures"
-                    "\n4. Risk Assessment Parameters:"
-                    "   - AI content percentage estimation"
-                    "   - Authenticity confidence level"
-                    "   - Quality assurance metrics"
-                    "   - Professional standards compliance"
-                    "   - Legal requirement adherence"
-                    "\nVerification Report Structure:"
-                    "1. Executive Assessment:"
-                    "   - Overall authenticity determination"
-                    "   - AI content percentage estimate"
-                    "   - Critical findings summary"
-                    "   - Verification recommendation"
-                    "\n2. Detailed Analysis:"
-                    "   - Content authenticity indicators"
-                    "   - AI detection results"
-                    "   - Quality assessment findings"
-                    "   - Risk evaluation outcomes"
-                    "\n3. Supporting Evidence:"
-                    "   - Specific authenticity markers"
-                    "   - Pattern analysis results"
-                    "   - Statistical evaluations"
-                    "   - Comparative assessments"
-                    "\n4. Verification Decision:"
-                    "   - Clear recommendation"
-                    "   - Supporting rationale"
-                    "   - Risk considerations"
-                    "   - Required actions"
-                    "\nQuality Control Measures:"
-                    "- Multiple verification methods"
-                    "- Cross-validation protocols"
-                    "- Bias elimination procedures"
-                    "- Standardized assessment criteria"
-                    "\nOutput Requirements:"
-                    "- Clear verification recommendation"
-                    "- Detailed supporting analysis"
-                    "- Specific evidence citations"
-                    "- Risk level assessment"
-                    "- Required follow-up actions"
-                    "\nDecision Criteria:"
-                    "- Automatic rejection if AI content >20%"
-                    "- Quality threshold requirements"
-                    "- Professional standard compliance"
-                    "- Legal requirement adherence"
-                )
-
-                # Run the Verifier agent with the prompt
-                run: RunResponse = Verifier.run(prompt)
-                
-                # Prepare report line with filename and recommendation
-                recommendation = run.content.strip()
-                report_lines.append(f"{filename}: {recommendation}")
+                with open(os.path.join(output_dir, filename), 'r', encoding='utf-8') as file:
+                    documents.append((filename, file.read()))
+
+        if mode == "concurrent":
+            # One request per report, a bounded number in flight
+            requests = [[document] for document in documents]
+        else:
+            requests = _batch(documents, VERIFY_MAX_BATCH_CHARS)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            verdicts = [verdict for batch in executor.map(propagate_deadline(_verify_documents), requests) for verdict in batch]
+
+        report_lines = [
+            f"{verdict.filename}: {verdict.verdict} "
+            f"(AI content: {verdict.ai_content_percentage if verdict.ai_content_percentage is not None else 'n/a'}%, "
+            f"confidence: {verdict.confidence or 'n/a'}) - {verdict.rationale}"
+            for verdict in verdicts
+        ]
+
+        # Keep the parsed verdicts next to the readable report
+        with open(os.path.join(verified_dir, 'Verification_Report.json'), 'w', encoding='utf-8') as json_file:
+            json.dump(VerificationResult(verdicts=verdicts).model_dump(), json_file, indent=2)
 
         # Define output file path for the verification report
         report_filepath = os.path.join(verified_dir, 'Verification_Report.txt')
-        
+
         # Write the report to a file in the verified directory
         with open(report_filepath, 'w', encoding='utf-8') as report_file:
             report_file.write('\n'.join(report_lines))
-        
+
         return f"Verification report written to {report_filepath}"
-    
+
     except Exception as e:
         return f"An error occurred: {e}"
@@ -0,0 +1,45 @@
+import re
+from functools import lru_cache
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Returns the tiktoken encoding, or None when it cannot be loaded (e.g. offline)"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"Falling back to approximate token counts: {e}")
+        return None
+
+def _approximate_tokens(text):
+    # Words and punctuation, keeping the whitespace in front of each so they can be joined back
+    return re.findall(r'\s*\w+|\s*[^\w\s]|\s+$', text)
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_approximate_tokens(text))
+
+def split_tokens(text: str, max_tokens: int, overlap: int = 0) -> list:
+    """Splits text into pieces of at most max_tokens tokens, cut on token boundaries"""
+    encoding = _encoding()
+    tokens = encoding.encode(text, disallowed_special=()) if encoding else _approximate_tokens(text)
+    step = max(1, max_tokens - overlap)
+
+    chunks = []
+    for start in range(0, len(tokens), step):
+        piece = tokens[start:start + max_tokens]
+        chunks.append(encoding.decode(piece) if encoding else "".join(piece))
+        if start + max_tokens >= len(tokens):
+            break
+    return chunks
+
+def clip_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """The first (or with keep_end, the last) max_tokens tokens of text"""
+    encoding = _encoding()
+    tokens = encoding.encode(text, disallowed_special=()) if encoding else _approximate_tokens(text)
+    if len(tokens) <= max_tokens:
+        return text
+    piece = tokens[len(tokens) - max_tokens:] if keep_end else tokens[:max_tokens]
+    return encoding.decode(piece) if encoding else "".join(piece)
@@ -0,0 +1,121 @@
+import os
+import hashlib
+import math
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from phi.agent import RunResponse
+from ...llm.resilience import call_llm, propagate_deadline
+from ...llm.single_flight import single_flight
+from dotenv import load_dotenv
+from .chunking import count_tokens, split_tokens
+from ...db.redis_db import redis_client
+load_dotenv()
+
+# Documents above this size are analysed from their chunk summaries
+LONG_DOCUMENT_TOKENS = int(os.getenv("LONG_DOCUMENT_TOKENS", "8000"))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "1500"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))
+
+# On average one paragraph in this many ends a chunk, see _chunk
+BOUNDARY_DIVISOR = 4
+
+CHUNK_PROMPT = (
+    "You are a professional legal analyst. Summarize the following section of a longer case document. "
+    "Keep every fact, date, party, amount, statement and cited evidence, in the order they appear, "
+    "so the section can later be analysed without the original text. Do not add commentary."
+    "\nSection:\n"
+)
+
+REDUCE_PROMPT = (
+    "You are a professional legal analyst. The following are consecutive section summaries of one case document. "
+    "Merge them into a single summary that keeps the chronology, parties, key facts, statements and evidence. "
+    "Do not add commentary."
+    "\nSection summaries:\n"
+)
+
+def _cached_summary(prompt, text):
+    """Summarizes text, caching the result by content hash"""
+    key = f"summary_cache:{hashlib.sha256((prompt + text).encode('utf-8')).hexdigest()}"
+    cached = redis_client.redis.get(key)
+    if cached is not None:
+        return cached
+
+    def summarise():
+        # Another caller may have filled the cache while this one was waiting to lead
+        cached = redis_client.redis.get(key)
+        if cached is not None:
+            return cached
+        run: RunResponse = call_llm("ChunkSummariser", prompt + text, name="ChunkSummariser")
+        redis_client.redis.set(key, run.content, ex=SUMMARY_CACHE_TTL)
+        return run.content
+
+    # Concurrent analysers of the same document share one summary of each chunk
+    return single_flight.do(key, summarise)
+
+def _chunk(text, max_tokens):
+    """
+    Splits text into chunks of whole paragraphs, with boundaries picked by the
+    paragraphs' content rather than their position. Editing one paragraph only
+    changes the chunk it lives in, the other chunks keep their hashes.
+    """
+    paragraphs = []
+    for paragraph in text.split("\n\n"):
+        if count_tokens(paragraph) > max_tokens:
+            paragraphs.extend(split_tokens(paragraph, max_tokens))
+        elif paragraph.strip():
+            paragraphs.append(paragraph)
+
+    chunks, current, size = [], [], 0
+    for paragraph in paragraphs:
+        tokens = count_tokens(paragraph)
+        if current and size + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += tokens
+        if size >= max_tokens // 4 and zlib.crc32(paragraph.encode('utf-8')) % BOUNDARY_DIVISOR == 0:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def _summarize_all(prompt, texts):
+    with ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY) as executor:
+        return list(executor.map(propagate_deadline(lambda text: _cached_summary(prompt, text)), texts))
+
+def condense_document(text, max_tokens=LONG_DOCUMENT_TOKENS):
+    """
+    Returns text unchanged when it fits in max_tokens. Longer documents are
+    summarized chunk by chunk, concurrently, and the ordered summaries are
+    merged level by level until they fit.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    summaries = _summarize_all(CHUNK_PROMPT, _chunk(text, SUMMARY_CHUNK_TOKENS))
+    combined = "\n\n".join(summaries)
+    while count_tokens(combined) > max_tokens and len(summaries) > 1:
+        groups = _chunk(combined, max_tokens)
+        if len(groups) >= len(summaries):
+            # Summaries are as large as the budget, merge them pairwise
+            groups = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+        summaries = _summarize_all(REDUCE_PROMPT, groups)
+        combined = "\n\n".join(summaries)
+    return combined
+
+def condense_rounds(text, max_tokens=LONG_DOCUMENT_TOKENS):
+    """
+    Upper bound on the rounds of ChunkSummariser calls condense_document
+    makes one after another on text: SUMMARY_CONCURRENCY calls run at a
+    time, and at worst every merge level only halves the summaries.
+    """
+    if count_tokens(text) <= max_tokens:
+        return 0
+    summaries = len(_chunk(text, SUMMARY_CHUNK_TOKENS))
+    rounds = math.ceil(summaries / SUMMARY_CONCURRENCY)
+    while summaries > 1:
+        summaries = math.ceil(summaries / 2)
+        rounds += math.ceil(summaries / SUMMARY_CONCURRENCY)
+    return rounds
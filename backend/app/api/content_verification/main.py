@@ -1,24 +1,135 @@
+import os
+import json
+import math
+import threading
 from .Agents.AITextDetector import AITextDetection
 from .Agents.FlowAnalyser import FlowAnalysis
 from .Agents.ReferenceAnalyser import ReferenceAnalysis
 from .Agents.Summarizer import Summarize
-from .Agents.Verifier import Verify
+from .Agents.Verifier import VERIFY_MAX_CONCURRENCY, Verify
+from .long_document import condense_rounds
+from .task_graph import TaskGraph, TaskResult
+from ...constants.llm_policies import LLM_POLICIES
+from ...llm.resilience import llm_deadline
+
+# Seconds each task gets on top of its LLM deadlines, for local work such as
+# loading models, embedding evidence and reading and writing files
+TASK_SLACK = float(os.getenv("VERIFICATION_TASK_SLACK", "120"))
+# How long a finished graph waits for timed out tasks to stop, see TaskGraph
+TASK_DRAIN_TIMEOUT = float(os.getenv("VERIFICATION_TASK_DRAIN_TIMEOUT", "30"))
+
+def _deadline(role, rounds=1):
+    """Seconds that rounds of role's calls made one after another can take, retries included"""
+    return rounds * LLM_POLICIES.get(role, LLM_POLICIES['default'])['deadline']
 
 class ContentVerification:
     def __init__(self,file_path,reference_path):
         self.file_path = file_path
         self.reference_path = reference_path
-    
-    def verify_content(self, file_path, reference_path):
+
+    @staticmethod
+    def _report_files(report_path):
+        """The report, and the structured output written alongside it, e.g. Verify's per-file verdicts"""
+        return report_path, os.path.splitext(report_path)[0] + '.json'
+
+    def _remove_reports(self, report_path):
+        for path in self._report_files(report_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _report_task(self, agent, report_path, timeout, abandoned, *args):
+        """
+        Wraps an agent so that its task result carries the report it wrote.
+        Its LLM calls end by the task's timeout, and if the task was abandoned
+        (set once it timed out) whatever it writes afterwards is removed.
         """
-        Runs all verification checks and returns results
+        def run():
+            # Drop reports left over from an earlier attempt so they cannot pass for this one
+            self._remove_reports(report_path)
+            with llm_deadline(timeout):
+                message = agent(*args)
+            if abandoned.is_set():
+                self._remove_reports(report_path)
+                raise RuntimeError("Timed out")
+            if not os.path.exists(report_path):
+                raise RuntimeError(message)
+            with open(report_path, 'r', encoding='utf-8') as report:
+                result = {"report_path": report_path, "report": report.read()}
+            data_path = self._report_files(report_path)[1]
+            if os.path.exists(data_path):
+                with open(data_path, 'r', encoding='utf-8') as data:
+                    result["data"] = json.load(data)
+            return result
+        return run
+
+    def verify_content(self, file_path, reference_path, progress_callback=None):
+        """
+        Runs all verification checks and returns their results by name.
+        The analysers are independent and run concurrently. Verify runs once they
+        have all completed, and is skipped if any of them failed or timed out.
+
+        Each task's timeout is the sum of the deadlines of the LLM stages it
+        runs one after another, plus TASK_SLACK, and its LLM calls are cut off
+        at that timeout. The whole run therefore takes at most the slowest
+        analyser's timeout, plus Verify's, plus TASK_DRAIN_TIMEOUT.
+        progress_callback(step, completed, total) is called as each check finishes.
         """
         self.file_path = file_path
         self.reference_path = reference_path
-        
-        print(AITextDetection(self.file_path))
-        print(FlowAnalysis(self.file_path))
-        print(Summarize(self.file_path))
-        print(ReferenceAnalysis(self.file_path, self.reference_path))
-        print(Verify(self.file_path))
 
+        base_dir = self.file_path[0:-9]
+        output_dir = f'{base_dir}/output'
+
+        report_paths = {
+            "ai_text_detection": os.path.join(output_dir, 'AITest.txt'),
+            "flow_analysis": os.path.join(output_dir, 'Analysis_Report.txt'),
+            "summary": os.path.join(output_dir, 'Summary.txt'),
+            "reference_analysis": os.path.join(output_dir, 'References_Analysis_Report.txt'),
+            "verification": f'{base_dir}/verified/Verification_Report.txt',
+        }
+
+        # Long case files are first condensed by rounds of ChunkSummariser calls
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as file:
+                condensing = _deadline("ChunkSummariser", condense_rounds(file.read()))
+        except OSError:
+            condensing = 0  # the agents report the unreadable file themselves
+        analysers = ["ai_text_detection", "flow_analysis", "summary", "reference_analysis"]
+        timeouts = {
+            "ai_text_detection": TASK_SLACK,
+            "flow_analysis": TASK_SLACK + condensing + _deadline("Analyzer"),
+            "summary": TASK_SLACK + condensing + _deadline("Summariser"),
+            # Concurrent map calls over the evidence batches, then the reduce call
+            "reference_analysis": TASK_SLACK + _deadline("ReferenceAnalyzer", 2),
+            # At most one request per analyser report, VERIFY_MAX_CONCURRENCY at a time
+            "verification": TASK_SLACK + _deadline("Verifier", math.ceil(len(analysers) / max(1, VERIFY_MAX_CONCURRENCY))),
+        }
+        abandoned = {name: threading.Event() for name in report_paths}
+
+        def add(name, agent, *args, depends_on=None):
+            task = self._report_task(agent, report_paths[name], timeouts[name], abandoned[name], *args)
+            graph.add(name, task, depends_on=depends_on, timeout=timeouts[name])
+
+        graph = TaskGraph(drain_timeout=TASK_DRAIN_TIMEOUT)
+        add("ai_text_detection", AITextDetection, self.file_path)
+        add("flow_analysis", FlowAnalysis, self.file_path)
+        add("summary", Summarize, self.file_path)
+        add("reference_analysis", ReferenceAnalysis, self.file_path, self.reference_path)
+        add("verification", Verify, self.file_path, depends_on=analysers)
+
+        completed = []
+        def on_result(result: TaskResult):
+            if result.status == "timed_out":
+                abandoned[result.name].set()
+            completed.append(result.name)
+            print(f"{result.name}: {result.status} in {result.elapsed:.1f}s")
+            if progress_callback:
+                progress_callback(result.name, len(completed), len(graph.tasks))
+
+        results = graph.run(on_result)
+        # Timed out agents that were still running when run() returned remove
+        # their own reports when they finish, see _report_task
+        for name, result in results.items():
+            if result.status != "completed":
+                self._remove_reports(report_paths[name])
+        return {name: result.model_dump() for name, result in results.items()}
@@ -0,0 +1,115 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pydantic import BaseModel
+from typing import Any, Callable, Dict, List, Optional
+
+class TaskResult(BaseModel):
+    name: str
+    status: str  # "completed", "failed", "timed_out" or "skipped"
+    output: Any = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+class Task(BaseModel):
+    name: str
+    func: Callable[[], Any]
+    depends_on: List[str] = []
+    timeout: Optional[float] = None
+
+class TaskGraph:
+    """
+    Minimal DAG executor for blocking tasks.
+
+    Every task whose dependencies have finished is started on a thread pool,
+    so independent tasks run concurrently and the graph takes as long as its
+    slowest path. A task only starts once all of its dependencies completed;
+    if one failed, timed out or was skipped, the task is skipped too.
+
+    A task that exceeds its timeout is reported as timed out straight away,
+    but its thread cannot be killed, so tasks should stop themselves by their
+    timeout (e.g. under llm_deadline). run() waits up to drain_timeout for
+    such threads to exit, so that normally nothing they do overlaps whatever
+    the caller does next, then returns regardless: the graph never takes
+    longer than the sum of the timeouts along its slowest path plus drain_timeout.
+    """
+    def __init__(self, max_workers: Optional[int] = None, drain_timeout: float = 30.0):
+        self.max_workers = max_workers
+        self.drain_timeout = drain_timeout
+        self.tasks: Dict[str, Task] = {}
+
+    def add(self, name: str, func: Callable[[], Any], depends_on: List[str] = None, timeout: Optional[float] = None):
+        self.tasks[name] = Task(name=name, func=func, depends_on=depends_on or [], timeout=timeout)
+        return self
+
+    def run(self, on_result: Optional[Callable[[TaskResult], None]] = None) -> Dict[str, TaskResult]:
+        pending = dict(self.tasks)
+        running = {}
+        abandoned = []  # futures of timed out tasks whose threads are still running
+        results: Dict[str, TaskResult] = {}
+
+        def finish(result: TaskResult):
+            results[result.name] = result
+            if on_result:
+                on_result(result)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers or len(self.tasks) or 1)
+        try:
+            while pending or running:
+                # Repeat, as skipping a task settles the dependencies of its own dependents
+                scheduled = True
+                while scheduled:
+                    scheduled = False
+                    for name, task in list(pending.items()):
+                        if not all(dep in results for dep in task.depends_on):
+                            continue
+                        del pending[name]
+                        scheduled = True
+                        unfinished = [dep for dep in task.depends_on if results[dep].status != "completed"]
+                        if unfinished:
+                            finish(TaskResult(
+                                name=name,
+                                status="skipped",
+                                error="Dependencies did not complete: " + ", ".join(f"{dep} {results[dep].status}" for dep in unfinished)
+                            ))
+                        else:
+                            running[executor.submit(task.func)] = (task, time.monotonic())
+
+                if not running:
+                    # Whatever is left depends on a task that does not exist
+                    for name in pending:
+                        finish(TaskResult(name=name, status="skipped", error="Unresolvable dependencies"))
+                    break
+
+                deadlines = [start + task.timeout for task, start in running.values() if task.timeout]
+                wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    task, start = running.pop(future)
+                    elapsed = time.monotonic() - start
+                    try:
+                        finish(TaskResult(name=task.name, status="completed", output=future.result(), elapsed=elapsed))
+                    except Exception as e:
+                        finish(TaskResult(name=task.name, status="failed", error=str(e), elapsed=elapsed))
+
+                now = time.monotonic()
+                for future, (task, start) in list(running.items()):
+                    if task.timeout and now - start >= task.timeout:
+                        del running[future]
+                        if not future.cancel():
+                            abandoned.append(future)
+                        finish(TaskResult(
+                            name=task.name,
+                            status="timed_out",
+                            error=f"Timed out after {task.timeout}s",
+                            elapsed=now - start
+                        ))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if abandoned:
+                print(f"Waiting up to {self.drain_timeout}s for {len(abandoned)} timed out task(s) to stop")
+                _, still_running = wait(abandoned, timeout=self.drain_timeout)
+                if still_running:
+                    print(f"{len(still_running)} timed out task(s) still running, leaving them behind")
+
+        return results
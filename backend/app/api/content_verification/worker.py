@@ -0,0 +1,116 @@
+import asyncio
+import os
+from ...db.job_queue import RedisJobQueue
+from ...db.redis_db import redis_client
+
+VERIFICATION_CONCURRENCY = int(os.getenv("VERIFICATION_CONCURRENCY", "2"))
+VERIFICATION_MAX_ATTEMPTS = int(os.getenv("VERIFICATION_MAX_ATTEMPTS", "3"))
+
+verification_queue = RedisJobQueue("verification", max_attempts=VERIFICATION_MAX_ATTEMPTS)
+
+async def enqueue_verification(case_id: str, file_path: str, reference_path: str):
+    """Queue content verification for a freshly created case"""
+    redis_client.set_verification_status(case_id, status="queued", attempts=0, progress=0)
+    await verification_queue.enqueue(
+        {"case_id": case_id, "file_path": file_path, "reference_path": reference_path},
+        job_id=case_id
+    )
+
+class VerificationWorker:
+    """Consumes the verification queue with a fixed number of concurrent jobs"""
+    def __init__(self, queue: RedisJobQueue, concurrency: int):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.tasks = []
+
+    async def start(self):
+        await self._requeue_stale()
+        self.tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        self.tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _maintain(self):
+        """Promote due retries and recover jobs of dead workers"""
+        while True:
+            try:
+                await self.queue.promote_delayed()
+                await self._requeue_stale()
+            except Exception as e:
+                print(f"Error maintaining verification queue: {e}")
+            await asyncio.sleep(self.queue.lease_seconds / 4)
+
+    async def _requeue_stale(self):
+        for job in await self.queue.requeue_stale():
+            redis_client.set_verification_status(
+                job["payload"]["case_id"],
+                status="failed",
+                attempts=job["attempts"],
+                error="The worker running verification stopped responding"
+            )
+
+    async def _heartbeat(self, job: dict):
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            await self.queue.heartbeat(job)
+
+    async def _consume(self):
+        while True:
+            try:
+                item = await self.queue.dequeue()
+            except Exception as e:
+                print(f"Error reading verification queue: {e}")
+                await asyncio.sleep(1)
+                continue
+            if item is None:
+                continue
+
+            raw, job = item
+            heartbeat = asyncio.create_task(self._heartbeat(job))
+            try:
+                await self._process(job)
+                await self.queue.ack(raw, job)
+            except Exception as e:
+                print(f"Error verifying case {job['payload']['case_id']}: {e}")
+                retry = await self.queue.fail(raw, job)
+                redis_client.set_verification_status(
+                    job["payload"]["case_id"],
+                    status="retrying" if retry else "failed",
+                    attempts=job["attempts"],
+                    error=str(e)
+                )
+            finally:
+                heartbeat.cancel()
+
+    async def _process(self, job: dict):
+        payload = job["payload"]
+        case_id = payload["case_id"]
+        redis_client.set_verification_status(case_id, status="running", attempts=job["attempts"] + 1, progress=0)
+
+        def on_progress(step, completed, total):
+            redis_client.set_verification_status(
+                case_id,
+                current_step=step,
+                progress=round(completed / total * 100)
+            )
+
+        # The agents and their dependencies load with the first job, not at startup
+        from .main import ContentVerification
+        content_verifier = ContentVerification(payload["file_path"], payload["reference_path"])
+        # Verification is blocking model and LLM work, keep it off the event loop
+        results = await asyncio.to_thread(
+            content_verifier.verify_content,
+            payload["file_path"],
+            payload["reference_path"],
+            on_progress
+        )
+        redis_client.set_verification_status(case_id, results=results)
+        if results["verification"]["status"] != "completed":
+            raise RuntimeError(f"Verification {results['verification']['status']}: {results['verification']['error']}")
+        redis_client.set_verification_status(case_id, status="completed", progress=100, error="")
+
+verification_worker = VerificationWorker(verification_queue, VERIFICATION_CONCURRENCY)
@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds to wait for any single Razorpay call
+PAYMENT_TIMEOUT = float(os.getenv("PAYMENT_TIMEOUT", "10"))
+# Razorpay calls in flight at once, whatever the request volume
+PAYMENT_MAX_WORKERS = int(os.getenv("PAYMENT_MAX_WORKERS", "4"))
+# "razorpay", or "fake" to run against FakeRazorpayClient
+PAYMENT_PROVIDER = os.getenv("PAYMENT_PROVIDER", "razorpay")
+
+class PaymentTimeout(Exception):
+    pass
+
+class FakeRazorpayClient:
+    """
+    In-memory stand-in for razorpay.Client exposing the calls the credits
+    routes make. Signatures are computed the way Razorpay computes them, so
+    sign() produces what a real checkout would send back. latency simulates
+    a slow gateway.
+    """
+    def __init__(self, key_secret: str = "fake_secret", latency: float = 0.0):
+        self.key_secret = key_secret
+        self.latency = latency
+        self.orders = {}
+        self.order = self
+        self.utility = self
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create(self, data: dict) -> dict:
+        self._wait()
+        order = dict(data, id=f"order_{uuid.uuid4().hex[:14]}", status="created", created_at=int(time.time()))
+        self.orders[order["id"]] = order
+        return order
+
+    def fetch(self, order_id: str) -> dict:
+        self._wait()
+        if order_id not in self.orders:
+            raise ValueError(f"The id provided does not exist: {order_id}")
+        return self.orders[order_id]
+
+    def sign(self, order_id: str, payment_id: str) -> str:
+        message = f"{order_id}|{payment_id}".encode()
+        return hmac.new(self.key_secret.encode(), message, hashlib.sha256).hexdigest()
+
+    def verify_payment_signature(self, params: dict) -> bool:
+        expected = self.sign(params["razorpay_order_id"], params["razorpay_payment_id"])
+        if not hmac.compare_digest(expected, params["razorpay_signature"]):
+            raise ValueError("Razorpay Signature Verification Failed")
+        return True
+
+def create_client():
+    if PAYMENT_PROVIDER == "fake":
+        return FakeRazorpayClient()
+    import razorpay
+    return razorpay.Client(auth=(os.getenv('RAZORPAY_KEY_ID'), os.getenv('RAZORPAY_KEY_SECRET')))
+
+class PaymentGateway:
+    """
+    Async front for the synchronous Razorpay client. Calls run on a small
+    dedicated executor with a timeout, so a slow or spiking payment provider
+    ties up at most max_workers threads and never the event loop.
+    """
+    def __init__(self, client=None, max_workers: int = PAYMENT_MAX_WORKERS, timeout: float = PAYMENT_TIMEOUT):
+        self._client = client
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="razorpay")
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = create_client()
+        return self._client
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, func, *args), self.timeout)
+        except asyncio.TimeoutError:
+            raise PaymentTimeout(f"Payment provider did not respond within {self.timeout}s")
+
+    async def create_order(self, data: dict) -> dict:
+        return await self._call(lambda: self.client.order.create(data=data))
+
+    async def fetch_order(self, order_id: str) -> dict:
+        return await self._call(self.client.order.fetch, order_id)
+
+    async def verify_signature(self, order_id: str, payment_id: str, signature: str):
+        """Raises if the signature does not match"""
+        params = {
+            'razorpay_payment_id': payment_id,
+            'razorpay_order_id': order_id,
+            'razorpay_signature': signature
+        }
+        await self._call(self.client.utility.verify_payment_signature, params)
@@ -1,21 +1,23 @@
-from fastapi import APIRouter, HTTPException
-import redis.asyncio as redis
-import razorpay
-from datetime import datetime, timedelta
-import os
+from fastapi import APIRouter, HTTPException, Path, Query
+from datetime import datetime
+import time
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 from ...constants.credits import CREDIT_COSTS
+from ...db.credit_ledger import CreditLedger
+from ...db.credit_rollups import CreditRollupWorker, history_page, monthly_summaries, monthly_summary
+from .payments import PaymentGateway, PaymentTimeout
 
 router = APIRouter()
 
-# Initialize Redis client
-redis_client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
+# Balances, monthly resets and history are updated atomically by the ledger's Lua scripts,
+# and balance reads are cached briefly in process
+credit_ledger = CreditLedger(monthly_credits=CREDIT_COSTS['monthly_free_credits'])
+# Folds the ledger's event stream into the per-month usage served below
+credit_rollups = CreditRollupWorker()
 
-# Initialize Razorpay client
-razorpay_client = razorpay.Client(
-    auth=(os.getenv('RAZORPAY_KEY_ID'), os.getenv('RAZORPAY_KEY_SECRET'))
-)
+# Razorpay calls run on their own bounded executor, off the event loop
+payment_gateway = PaymentGateway()
 
 class UseCreditsRequest(BaseModel):
     user_id: str
@@ -35,6 +37,7 @@ class VerifyPaymentRequest(BaseModel):
 class GetUserCreditsResponse(BaseModel):
     credits: int
     next_reset: str
+    plan: str = "free"
 
 class UseCreditsResponse(BaseModel):
     success: bool
@@ -51,33 +54,34 @@ class BatchCreditUpdate(BaseModel):
     user_id: str
     deductions: List[CreditDeduction]
 
+class CreditEvent(BaseModel):
+    id: str
+    kind: str  # "debit" or "credit"
+    service: str
+    cost: int
+    timestamp: float
+
+class CreditHistoryResponse(BaseModel):
+    events: List[CreditEvent]
+    next_before: Optional[str] = None  # pass as `before` for the next page
+
+class ServiceUsage(BaseModel):
+    cost: int
+    count: int
+
+class MonthlyUsage(BaseModel):
+    month: str
+    debited: int
+    credited: int
+    services: Dict[str, ServiceUsage]
+
 async def get_or_create_user_credits(user_id: str) -> GetUserCreditsResponse:
     """Get or create user credits with monthly reset."""
-    credits_key = f"user:{user_id}:credits"
-    last_reset_key = f"user:{user_id}:last_reset"
-
-    # Get last reset time
-    last_reset = await redis_client.get(last_reset_key)
-    
-    # Check if user exists or needs monthly reset
-    if not last_reset or (
-        datetime.now() - datetime.fromisoformat(last_reset.decode('utf-8')) > timedelta(days=30)
-    ):
-        # New user or monthly reset needed
-        await redis_client.set(credits_key, CREDIT_COSTS['monthly_free_credits'])
-        await redis_client.set(last_reset_key, datetime.now().isoformat())
-        return GetUserCreditsResponse(
-            credits=CREDIT_COSTS['monthly_free_credits'],
-            next_reset=(datetime.now() + timedelta(days=30)).isoformat()
-        )
-    
-    # Get current credits
-    credits = int(await redis_client.get(credits_key) or 0)
-    next_reset = datetime.fromisoformat(last_reset.decode('utf-8')) + timedelta(days=30)
-    
+    account = await credit_ledger.balance(user_id)
     return GetUserCreditsResponse(
-        credits=credits,
-        next_reset=next_reset.isoformat()
+        credits=account["credits"],
+        next_reset=datetime.fromtimestamp(account["next_reset"]).isoformat(),
+        plan=account["plan"]
     )
 
 @router.get("/user/credits/{user_id}")
@@ -85,6 +89,25 @@ async def get_user_credits(user_id: str) -> GetUserCreditsResponse:
     """Get user's credit information."""
     return await get_or_create_user_credits(user_id)
 
+@router.get("/user/credits/{user_id}/history")
+async def get_credit_history(
+    user_id: str,
+    before: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200)
+) -> CreditHistoryResponse:
+    """Page through a user's credit events, newest first."""
+    return CreditHistoryResponse(**await history_page(credit_ledger.redis, user_id, before, limit))
+
+@router.get("/user/credits/{user_id}/usage")
+async def get_credit_usage(user_id: str, months: int = Query(12, ge=1, le=60)) -> List[MonthlyUsage]:
+    """Per-service usage of a user's most recent months."""
+    return [MonthlyUsage(**summary) for summary in await monthly_summaries(credit_ledger.redis, user_id, months)]
+
+@router.get("/user/credits/{user_id}/usage/{month}")
+async def get_monthly_credit_usage(user_id: str, month: str = Path(pattern=r"^\d{4}-\d{2}$")) -> MonthlyUsage:
+    """Per-service usage of one month (YYYY-MM)."""
+    return MonthlyUsage(**await monthly_summary(credit_ledger.redis, user_id, month))
+
 @router.post("/use-credits")
 async def use_credits(request: UseCreditsRequest) -> UseCreditsResponse:
     """Use credits for a service."""
@@ -92,27 +115,21 @@ async def use_credits(request: UseCreditsRequest) -> UseCreditsResponse:
         raise HTTPException(status_code=400, detail="Invalid service")
     
     cost = CREDIT_COSTS[request.service]
-    credits_key = f"user:{request.user_id}:credits"
+    result = await credit_ledger.deduct(request.user_id, [(request.service, cost, time.time())])
     
-    # Get current credits
-    current_credits = int(await redis_client.get(credits_key) or 0)
-    
-    if current_credits < cost:
+    if not result["success"]:
         return UseCreditsResponse(
             success=False,
             message="Not enough credits",
-            remaining_credits=current_credits,
+            remaining_credits=result["credits"],
             deducted_credits=0
         )
     
-    # Deduct credits
-    new_balance = await redis_client.decrby(credits_key, cost)
-    
     return UseCreditsResponse(
         success=True,
         message=f"Credits deducted for {request.service}",
-        remaining_credits=new_balance,
-        deducted_credits=cost
+        remaining_credits=result["credits"],
+        deducted_credits=result["deducted"]
     )
 
 @router.post("/create-order")
@@ -128,8 +145,10 @@ async def create_order(request: CreateOrderRequest) -> dict:
                 'user_id': request.user_id
             }
         }
-        order = razorpay_client.order.create(data=order_data)
+        order = await payment_gateway.create_order(order_data)
         return {"order_id": order['id']}
+    except PaymentTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -138,27 +157,23 @@ async def verify_payment(request: VerifyPaymentRequest) -> dict:
     """Verify Razorpay payment and add credits to user account."""
     try:
         # Verify payment signature
-        params_dict = {
-            'razorpay_payment_id': request.payment_id,
-            'razorpay_order_id': request.order_id,
-            'razorpay_signature': request.signature
-        }
-        razorpay_client.utility.verify_payment_signature(params_dict)
+        await payment_gateway.verify_signature(request.order_id, request.payment_id, request.signature)
         
         # Get order details
-        order = razorpay_client.order.fetch(request.order_id)
+        order = await payment_gateway.fetch_order(request.order_id)
         user_id = order['notes']['user_id']
         credits = int(order['notes']['credits'])
         
-        # Add credits to user account
-        credits_key = f"user:{user_id}:credits"
-        new_balance = await redis_client.incrby(credits_key, credits)
+        # Add credits to user account, at most once per order however often verification is retried
+        result = await credit_ledger.credit(user_id, credits, reference=request.order_id)
         
         return {
             "success": True,
-            "message": "Payment verified and credits added",
-            "new_balance": new_balance
+            "message": "Payment verified and credits added" if result["success"] else "Payment already processed",
+            "new_balance": result["credits"]
         }
+    except PaymentTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e)) 
 
@@ -168,36 +183,24 @@ async def batch_use_credits(data: BatchCreditUpdate):
     Batch process credit deductions.
     This endpoint handles multiple credit deductions in a single request.
     """
-    # Get current credits
-    credits = await redis_client.get(f"credits:{data.user_id}")
-    if credits is None:
-        credits = 1000  # Initialize with free credits
-    
-    credits = int(credits)
+    if any(deduction.cost < 0 for deduction in data.deductions):
+        raise HTTPException(status_code=400, detail="Deduction costs must not be negative")
 
-    # Calculate total cost
-    total_cost = sum(deduction.cost for deduction in data.deductions)
+    # Checked and deducted together, with one history entry per deduction
+    result = await credit_ledger.deduct(
+        data.user_id,
+        [(deduction.service, deduction.cost, deduction.timestamp) for deduction in data.deductions]
+    )
 
     # Check if user has enough credits
-    if credits < total_cost:
+    if not result["success"]:
         raise HTTPException(
             status_code=400,
             detail="Insufficient credits for batch operation"
         )
 
-    # Deduct credits
-    new_credits = credits - total_cost
-    await redis_client.set(f"credits:{data.user_id}", new_credits)
-
-    # Store transaction history (optional)
-    for deduction in data.deductions:
-        await redis_client.lpush(
-            f"credit_history:{data.user_id}",
-            f"{deduction.service}:{deduction.cost}:{deduction.timestamp}"
-        )
-
     return {
         "success": True,
-        "remaining_credits": new_credits,
-        "total_deducted": total_cost
+        "remaining_credits": result["credits"],
+        "total_deducted": result["deducted"]
     } 
\ No newline at end of file
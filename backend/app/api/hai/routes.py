@@ -1,26 +1,33 @@
-from fastapi import APIRouter,HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from ...human_ai.hai import Judge, ProcessInputRequest, TurnResponse, ConversationList
 from ...db.redis_db import redis_client
+from ..rate_limit import rate_limit
 
 router = APIRouter()
 
-# Create a single judge instance to be used across all routes
-judge = Judge()
+# A single judge shared by all routes, created on first request
+_judge = None
+
+def get_judge() -> Judge:
+    global _judge
+    if _judge is None:
+        _judge = Judge()
+    return _judge
 
 @router.post("/start-simulation", response_model=TurnResponse)
 async def start_simulation():
     """Start a new HAI simulation"""
-    return await judge.start_simulation()
+    return await get_judge().start_simulation()
 
-@router.post("/process-input", response_model=TurnResponse)
+@router.post("/process-input", response_model=TurnResponse, dependencies=[Depends(rate_limit("hai_process_input"))])
 async def process_input(request: ProcessInputRequest):
     """Process input from either human or AI"""
-    return await judge.process_input(request)
+    return await get_judge().process_input(request)
 
 @router.get("/conversation-history", response_model=ConversationList)
 async def get_conversation_history():
     """Get the conversation history"""
-    return ConversationList(conversations=judge.conversations) 
+    return ConversationList(conversations=get_judge().conversations) 
 
 @router.get("/get-case-details/{case_id}")
 async def get_conversations(case_id: str):
@@ -0,0 +1,44 @@
+from fastapi import HTTPException, Request
+from fastapi.requests import HTTPConnection
+from typing import Tuple
+from ..constants.rate_limits import RATE_LIMITS
+from ..db.rate_limiter import TokenBucketLimiter
+
+limiter = TokenBucketLimiter()
+
+def _buckets(route: str, user_id: str):
+    buckets = []
+    for scope, (capacity, period) in RATE_LIMITS[route].items():
+        name = f"{route}:{user_id}" if scope == "user" else f"{route}:global"
+        buckets.append((name, capacity, capacity / period))
+    return buckets
+
+async def check_rate_limit(route: str, user_id: str) -> Tuple[bool, int]:
+    """Takes a token for user_id on route, returns (allowed, seconds to wait)"""
+    return await limiter.acquire(_buckets(route, user_id))
+
+def caller_id(connection: HTTPConnection) -> str:
+    """
+    The caller a per-user bucket belongs to: the identity an authentication
+    layer put in connection.state.user_id, or else the client address.
+    Headers and path parameters are chosen by the client, so they are never used.
+    """
+    user_id = getattr(connection.state, "user_id", None)
+    if user_id:
+        return f"user:{user_id}"
+    return f"addr:{connection.client.host}" if connection.client else "anonymous"
+
+def rate_limit(route: str):
+    """
+    Dependency that admits a request through the route's token buckets,
+    answering 429 with Retry-After once a bucket runs dry.
+    """
+    async def dependency(request: Request):
+        allowed, retry_after = await check_rate_limit(route, caller_id(request))
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please retry later",
+                headers={"Retry-After": str(retry_after)}
+            )
+    return dependency
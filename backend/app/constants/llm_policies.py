@@ -0,0 +1,37 @@
+import os
+
+# How LLM calls are made for each agent role (see llm/resilience.py):
+#   deadline: seconds a caller waits in total, retries and hedges included
+#   retries: further attempts after an error, while the retry budget allows
+#   hedge: send a duplicate request once an attempt outlives the role's p95 latency
+# Interactive roles get short deadlines and cheap fallbacks; background
+# verification reports get long deadlines and no hedging.
+LLM_POLICIES = {
+    'default': {'deadline': 60, 'retries': 1, 'hedge': False},
+    'judge': {'deadline': 8, 'retries': 1, 'hedge': True},
+    'score_analyser': {'deadline': 5, 'retries': 1, 'hedge': True},
+    'context_checker': {'deadline': 5, 'retries': 1, 'hedge': True},
+    'summarising_agent': {'deadline': 30, 'retries': 1, 'hedge': False},
+    'RagAgent': {'deadline': 30, 'retries': 1, 'hedge': False},
+    'memory_summariser': {'deadline': 20, 'retries': 1, 'hedge': False},
+    'query_agent': {'deadline': 30, 'retries': 1, 'hedge': True},
+    'ChunkSummariser': {'deadline': 90, 'retries': 2, 'hedge': False},
+    'Summariser': {'deadline': 180, 'retries': 2, 'hedge': False},
+    'Analyzer': {'deadline': 180, 'retries': 2, 'hedge': False},
+    'ReferenceAnalyzer': {'deadline': 180, 'retries': 2, 'hedge': False},
+    'Verifier': {'deadline': 180, 'retries': 2, 'hedge': False},
+}
+
+_TYPES = {'deadline': float, 'retries': int, 'hedge': lambda value: value.lower() == "true"}
+
+def _override(role: str, setting: str, default):
+    # e.g. LLM_JUDGE_DEADLINE=5 or LLM_QUERY_AGENT_HEDGE=false
+    value = os.getenv(f"LLM_{role.upper()}_{setting.upper()}")
+    return _TYPES[setting](value) if value else default
+
+LLM_POLICIES = {
+    role: {setting: _override(role, setting, value) for setting, value in policy.items()}
+    for role, policy in LLM_POLICIES.items()
+}
+
+__all__ = ['LLM_POLICIES']
@@ -0,0 +1,26 @@
+import os
+
+# Token buckets for the routes that call the LLM, as (capacity, refill period in seconds):
+# a bucket holds up to `capacity` requests and regains them all over the period.
+# "user" buckets are per caller, "global" buckets are shared by everyone.
+RATE_LIMITS = {
+    'consultancy_ask': {'user': (10, 60), 'global': (300, 60)},
+    'case_create': {'user': (3, 300), 'global': (60, 60)},
+    'hai_process_input': {'user': (20, 60), 'global': (600, 60)},
+    'hai_websocket_turn': {'user': (20, 60), 'global': (600, 60)},
+}
+
+def _override(route: str, scope: str, default):
+    # e.g. RATE_LIMIT_CONSULTANCY_ASK_USER=20/60
+    value = os.getenv(f"RATE_LIMIT_{route.upper()}_{scope.upper()}")
+    if not value:
+        return default
+    capacity, period = value.split("/")
+    return int(capacity), float(period)
+
+RATE_LIMITS = {
+    route: {scope: _override(route, scope, limit) for scope, limit in scopes.items()}
+    for route, scopes in RATE_LIMITS.items()
+}
+
+__all__ = ['RATE_LIMITS']
@@ -0,0 +1,23 @@
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+from .consultancy import CONSULTANCY_INDEX_DIR, build_consultancy_index
+
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the persisted consultancy retrieval index")
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR"), help="Directory with the legal corpus (default: $DATA_DIR)")
+    parser.add_argument("--index-dir", default=CONSULTANCY_INDEX_DIR, help="Where to write the index")
+    args = parser.parse_args()
+
+    if not args.data_dir:
+        parser.error("--data-dir is required when DATA_DIR is not set")
+
+    start = time.perf_counter()
+    store = build_consultancy_index(args.data_dir, args.index_dir)
+    print(f"Indexed {len(store)} chunks from {args.data_dir} into {args.index_dir} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
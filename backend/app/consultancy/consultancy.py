@@ -1,38 +1,105 @@
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, Settings
-from phi.knowledge.llamaindex import LlamaIndexKnowledgeBase
-from phi.agent import Agent, RunResponse
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from phi.model.google import Gemini
+from phi.agent import RunResponse
+from ..llm.resilience import call_llm
 import os
+import threading
 from dotenv import load_dotenv
+from ..ml.embedding import get_embedding_service
+from ..retrieval.vector_store import PersistedVectorStore, documents_to_nodes
+from ..retrieval.bm25 import BM25Index
+from ..retrieval.citations import CitationIndex
 
 load_dotenv()
 
-Settings.chunk_size = 256
-Settings.chunk_overlap = 50
-Settings.embed_model = HuggingFaceEmbedding(
-    model_name="all-MiniLM-L6-v2"
-)
+CONSULTANCY_INDEX_DIR = os.getenv("CONSULTANCY_INDEX_DIR", "app/consultancy/index")
+# Chunking of the statute index, independent of the per-case indexes
+CHUNK_SIZE = 256
+CHUNK_OVERLAP = 50
+CONTEXT_TOP_K = int(os.getenv("CONSULTANCY_TOP_K", "5"))
+# Fewer chunks are needed when the query cites a provision the index can look up
+CITATION_TOP_K = int(os.getenv("CONSULTANCY_CITATION_TOP_K", "3"))
+
+def load_corpus_nodes(data_dir):
+    """Parses and chunks every document of the legal corpus"""
+    from llama_index.core import SimpleDirectoryReader
+    documents = SimpleDirectoryReader(input_dir=data_dir).load_data()
+    return documents_to_nodes(documents, CHUNK_SIZE, CHUNK_OVERLAP)
+
+def build_consultancy_index(data_dir, index_dir=CONSULTANCY_INDEX_DIR):
+    """Embeds the legal corpus and persists its vector, BM25 and citation indexes to index_dir"""
+    nodes = load_corpus_nodes(data_dir)
+    embedder = get_embedding_service()
+    store = PersistedVectorStore.build(
+        nodes,
+        embedder,
+        manifest={"embed_model": embedder.model_name, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+    )
+    store.save(index_dir)
+    BM25Index.build([node["text"] for node in nodes]).save(index_dir)
+    CitationIndex.build(nodes).save(index_dir)
+    return store
+
+def load_consultancy_retriever(index_dir=CONSULTANCY_INDEX_DIR):
+    """Loads the persisted indexes, building them first if they are missing"""
+    embedder = get_embedding_service()
+    if not os.path.exists(os.path.join(index_dir, BM25Index.FILE)):
+        # Normally built ahead of time with `python -m app.consultancy.build_index`
+        print(f"No consultancy index in {index_dir}, building it from DATA_DIR")
+        build_consultancy_index(os.getenv("DATA_DIR"), index_dir)
+
+    store = PersistedVectorStore.load(index_dir)
+    if store.manifest.get("embed_model", embedder.model_name) != embedder.model_name:
+        raise ValueError(
+            f"Index in {index_dir} was embedded with {store.manifest['embed_model']}, not {embedder.model_name}; "
+            "rebuild it with `python -m app.consultancy.build_index`"
+        )
+    from ..retrieval.retriever import HybridRetriever
+    return HybridRetriever(
+        store,
+        embedder,
+        bm25=BM25Index.load(index_dir),
+        citations=CitationIndex.load(index_dir),
+        similarity_top_k=CONTEXT_TOP_K,
+        citation_top_k=CITATION_TOP_K
+    )
+
+_statute_retriever = None
+_statute_retriever_lock = threading.Lock()
+
+def get_statute_retriever():
+    """
+    Returns the process-wide retriever over the legal corpus. It is shared by
+    the consultancy agent and the courtroom lawyers, so the corpus is loaded
+    once per process.
+    """
+    global _statute_retriever
+    if _statute_retriever is None:
+        with _statute_retriever_lock:
+            if _statute_retriever is None:
+                _statute_retriever = load_consultancy_retriever()
+    return _statute_retriever
 
 class RAG:
     def __init__(self):
-        data_dir = os.getenv("DATA_DIR")
-        documents = SimpleDirectoryReader(input_dir=data_dir).load_data()
-        self.index = VectorStoreIndex.from_documents(documents)
-        self.retriever = self.index.as_retriever(similarity_top_k=5)
-        self.knowledge_base = LlamaIndexKnowledgeBase(retriever=self.retriever)
-        self.query_agent = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")), debug_mode=True)
-        self.consulting_agent = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")),knowledge_base=self.knowledge_base, debug_mode=True)
-    
+        self.retriever = get_statute_retriever()
+
+    def get_context(self, prompt):
+        """Retrieves the passages most similar to the prompt, labelled with their source"""
+        passages = []
+        for idx, result in enumerate(self.retriever.retrieve(prompt), 1):
+            metadata = result.node.metadata
+            source = metadata.get("file_name", "unknown source")
+            if metadata.get("page_label"):
+                source += f", page {metadata['page_label']}"
+            passages.append(f"[{idx}] ({source}, relevance {result.score:.2f})\n{result.node.get_content()}")
+        return "\n\n".join(passages)
+
     def ask(self, prompt):
-        query = f"For the given prompt {prompt} get all relevant context needed to give the answer."
-        run: RunResponse = self.consulting_agent.run(query)
-        print(run.content)
+        context = self.get_context(prompt)
         query = (
             "You are a legal analysis system with comprehensive knowledge of Indian law and international jurisprudence. "
             "\nTask Configuration:"
             f"Analyze the following query: {prompt}"
-            f"Reference content provided: {run.content}"
+            f"Reference content provided (numbered passages with their source):\n{context}\n"
             "\nAnalysis Framework:"
             "1. Query Classification:"
             "   - Determine if query requires provided context or can be answered from legal knowledge base"
@@ -66,10 +133,28 @@ class RAG:
             "\nContext Integration Rules:"
             "- Use provided context only if essential for query resolution"
             "- Clearly distinguish between context-based and general legal knowledge"
+            "- Cite the source of any passage you rely on"
+        )
+        # Retried or simultaneous identical questions share one answer
+        run: RunResponse = call_llm(
+            "query_agent", query, single_flight=True, debug_mode=True,
+            # Without the model, answer with what retrieval found
+            fallback=lambda: f"The legal assistant is unavailable right now. The most relevant passages for your question are:\n\n{context}"
         )
-        run: RunResponse = self.query_agent.run(query)
         return run.content
     
+_rag = None
+_rag_lock = threading.Lock()
+
+def get_rag() -> RAG:
+    """Returns the process-wide consultancy agent, loading its index on first use"""
+    global _rag
+    if _rag is None:
+        with _rag_lock:
+            if _rag is None:
+                _rag = RAG()
+    return _rag
+
 # def main():
 #     agent = RAG()
 #     ans = agent.ask("If there is a case where a wife kills the husband in self defense what all charges should she be charged with. Give relevant articles and acts for the charges.")
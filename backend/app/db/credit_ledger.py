@@ -0,0 +1,231 @@
+from redis.asyncio import Redis
+import asyncio
+import os
+import time
+from typing import List, Optional, Tuple
+
+# Seconds a balance may be served from the in-process cache
+CREDIT_CACHE_TTL = float(os.getenv("CREDIT_CACHE_TTL", "5"))
+# Days of raw credit events kept in the stream, rollups are kept indefinitely
+CREDIT_EVENT_RETENTION_DAYS = int(os.getenv("CREDIT_EVENT_RETENTION_DAYS", "90"))
+INVALIDATION_CHANNEL = "credits:invalidate"
+EVENTS_STREAM = "credit_events"
+
+# Shared by every script: loads the account hash, creating it or applying the
+# monthly reset as needed.
+# KEYS[1] account hash, KEYS[2] legacy balance, KEYS[3] legacy last reset
+# ARGV[1] now, ARGV[2] reset period, ARGV[3] monthly credits, ARGV[4] default plan,
+# ARGV[5] invalidation channel, ARGV[6] user id
+REFRESH_LUA = """
+local function epoch(value)
+    local seconds = tonumber(value)
+    if seconds then
+        return seconds
+    end
+    -- Older versions stored the last reset as an ISO timestamp
+    local y, m, d, hh, mm, ss = string.match(value, "^(%d+)-(%d+)-(%d+)T(%d+):(%d+):(%d+)")
+    if not y then
+        return 0
+    end
+    y, m = tonumber(y), tonumber(m)
+    if m <= 2 then
+        y, m = y - 1, m + 12
+    end
+    local days = 365 * y + math.floor(y / 4) - math.floor(y / 100) + math.floor(y / 400)
+        + math.floor((153 * (m - 3) + 2) / 5) + tonumber(d) - 719469
+    return days * 86400 + tonumber(hh) * 3600 + tonumber(mm) * 60 + tonumber(ss)
+end
+
+local now = tonumber(ARGV[1])
+local account = redis.call('HMGET', KEYS[1], 'credits', 'reset_at', 'plan')
+local balance, reset_at, plan = tonumber(account[1]), tonumber(account[2]), account[3]
+local changed = false
+
+if not reset_at then
+    -- Accounts from before the hash layout keep their balance and reset time
+    local legacy_reset = redis.call('GET', KEYS[3])
+    if legacy_reset then
+        balance = tonumber(redis.call('GET', KEYS[2]) or '0')
+        reset_at = epoch(legacy_reset)
+        redis.call('DEL', KEYS[2], KEYS[3])
+    end
+    changed = true
+end
+if not plan then
+    plan = ARGV[4]
+end
+if not reset_at or now - reset_at > tonumber(ARGV[2]) then
+    balance = tonumber(ARGV[3])
+    reset_at = now
+    changed = true
+end
+if changed then
+    redis.call('HSET', KEYS[1], 'credits', balance, 'reset_at', reset_at, 'plan', plan)
+end
+"""
+
+# KEYS[4] event stream; ARGV[7] oldest stream id to retain,
+# then (service, cost, timestamp) per deduction.
+# Returns {deducted (1/0), balance, total cost, last reset, plan}
+DEDUCT_LUA = REFRESH_LUA + """
+local total = 0
+for i = 8, #ARGV, 3 do
+    total = total + tonumber(ARGV[i + 1])
+end
+if balance < total then
+    return {0, balance, total, reset_at, plan}
+end
+balance = redis.call('HINCRBY', KEYS[1], 'credits', -total)
+for i = 8, #ARGV, 3 do
+    redis.call('XADD', KEYS[4], 'MINID', '~', ARGV[7], '*',
+        'user_id', ARGV[6], 'kind', 'debit', 'service', ARGV[i], 'cost', ARGV[i + 1], 'timestamp', ARGV[i + 2])
+end
+redis.call('PUBLISH', ARGV[5], ARGV[6])
+return {1, balance, total, reset_at, plan}
+"""
+
+# KEYS[5] optional marker of the payment being credited;
+# ARGV[7] oldest stream id to retain, ARGV[8] credits to add, ARGV[9] source, ARGV[10] marker value.
+# Returns {credited (1/0), balance, 0, last reset, plan}, 0 when the marker was already set
+CREDIT_LUA = REFRESH_LUA + """
+if KEYS[5] and not redis.call('SET', KEYS[5], ARGV[10], 'NX') then
+    return {0, balance, 0, reset_at, plan}
+end
+balance = redis.call('HINCRBY', KEYS[1], 'credits', ARGV[8])
+redis.call('XADD', KEYS[4], 'MINID', '~', ARGV[7], '*',
+    'user_id', ARGV[6], 'kind', 'credit', 'service', ARGV[9], 'cost', ARGV[8], 'timestamp', ARGV[1])
+redis.call('PUBLISH', ARGV[5], ARGV[6])
+return {1, balance, 0, reset_at, plan}
+"""
+
+# Returns {1, balance, 0, last reset, plan}
+BALANCE_LUA = REFRESH_LUA + """
+return {1, balance, 0, reset_at, plan}
+"""
+
+class CreditLedger:
+    """
+    Per-user credit accounts kept consistent by Lua scripts.
+
+    An account is one hash (credits, reset_at, plan). Each operation is one
+    script call, so the monthly reset, the balance check, the deduction and
+    the history entry are applied atomically in a single round-trip, and
+    concurrent requests cannot overdraw an account. Every deduction and
+    purchase is also appended to the credit_events stream, which
+    CreditRollupWorker (credit_rollups.py) folds into monthly usage.
+
+    Balance reads are served from a short-lived in-process cache. Scripts
+    that change a balance publish the user id, and every process listening
+    (see start()) drops its cached copy.
+    """
+    def __init__(self, monthly_credits: int, reset_days: int = 30, plan: str = "free",
+                 cache_ttl: float = CREDIT_CACHE_TTL, retention_days: int = CREDIT_EVENT_RETENTION_DAYS,
+                 client: Optional[Redis] = None):
+        self.redis = client or Redis.from_url(
+            url=os.getenv("REDIS_URL", "redis://localhost:6379"),
+            decode_responses=True
+        )
+        self.monthly_credits = monthly_credits
+        self.reset_seconds = reset_days * 86400
+        self.retention_ms = retention_days * 86400 * 1000
+        self.plan = plan
+        self.cache_ttl = cache_ttl
+
+        self._deduct = self.redis.register_script(DEDUCT_LUA)
+        self._credit = self.redis.register_script(CREDIT_LUA)
+        self._balance = self.redis.register_script(BALANCE_LUA)
+        self._cache = {}  # user_id -> (expires_at, account)
+        self._listener = None
+
+    def _keys(self, user_id: str) -> List[str]:
+        return [
+            f"user:{user_id}:account",
+            f"user:{user_id}:credits",  # legacy balance
+            f"user:{user_id}:last_reset",  # legacy reset time
+            EVENTS_STREAM
+        ]
+
+    def _args(self, user_id: str, *extra) -> list:
+        now = time.time()
+        oldest_id = f"{int(now * 1000) - self.retention_ms}-0"
+        return [int(now), self.reset_seconds, self.monthly_credits, self.plan, INVALIDATION_CHANNEL, user_id, oldest_id, *extra]
+
+    async def _run(self, script, user_id: str, *extra, extra_keys: List[str] = ()) -> dict:
+        success, balance, total, reset_at, plan = await script(
+            keys=self._keys(user_id) + list(extra_keys),
+            args=self._args(user_id, *extra)
+        )
+        account = {
+            "credits": int(balance),
+            "next_reset": float(reset_at) + self.reset_seconds,
+            "plan": plan
+        }
+        self._cache[user_id] = (time.monotonic() + self.cache_ttl, account)
+        return dict(account, success=bool(success), deducted=int(total) if success else 0)
+
+    async def balance(self, user_id: str) -> dict:
+        """Returns {"credits", "next_reset", "plan"} with next_reset as a unix timestamp"""
+        cached = self._cache.get(user_id)
+        if cached and cached[0] > time.monotonic() and cached[1]["next_reset"] > time.time():
+            return dict(cached[1])
+        account = await self._run(self._balance, user_id)
+        return {key: account[key] for key in ("credits", "next_reset", "plan")}
+
+    async def deduct(self, user_id: str, deductions: List[Tuple[str, int, float]]) -> dict:
+        """
+        Deducts the total cost of (service, cost, timestamp) deductions if the
+        balance covers all of them, and nothing otherwise.
+        Returns {"success", "credits", "deducted", "next_reset", "plan"}.
+        """
+        args = []
+        for service, cost, timestamp in deductions:
+            args.extend([service, int(cost), timestamp])
+        return await self._run(self._deduct, user_id, *args)
+
+    def _payment_key(self, reference: str) -> str:
+        return f"payment:processed:{reference}"
+
+    async def credit(self, user_id: str, amount: int, source: str = "purchase", reference: Optional[str] = None) -> dict:
+        """
+        Adds purchased credits. With a reference (e.g. a payment order id) the
+        credit is applied at most once: the reference is marked processed in
+        the same script that adds the credits.
+        Returns {"success", "credits", "next_reset", "plan"}, success being
+        False when the reference had already been credited.
+        """
+        if reference is None:
+            account = await self._run(self._credit, user_id, int(amount), source)
+        else:
+            account = await self._run(
+                self._credit, user_id, int(amount), source, f"{user_id}:{int(time.time())}",
+                extra_keys=[self._payment_key(reference)]
+            )
+        return {key: account[key] for key in ("success", "credits", "next_reset", "plan")}
+
+    async def start(self):
+        """Start dropping cached balances that other processes change"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._cache.pop(message["data"], None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Anything published while disconnected was missed
+                print(f"Credit invalidation listener error: {e}")
+                self._cache.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
@@ -0,0 +1,183 @@
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from .credit_ledger import EVENTS_STREAM
+
+ROLLUP_GROUP = "credit-rollups"
+# Events kept per user for history pages
+CREDIT_HISTORY_LENGTH = int(os.getenv("CREDIT_HISTORY_LENGTH", "1000"))
+
+def _usage_key(user_id: str, month: str) -> str:
+    return f"credit_usage:{user_id}:{month}"
+
+def _months_key(user_id: str) -> str:
+    return f"credit_months:{user_id}"
+
+def _history_key(user_id: str) -> str:
+    return f"credit_events:{user_id}"
+
+# KEYS[1] event stream, then (usage hash, months zset, user history stream) per event.
+# ARGV[1] group, ARGV[2] history length, then
+# (id, user id, kind, service, cost, timestamp, month, month score) per event.
+# An event is folded in only if this call is the one that acknowledges it,
+# so a redelivered event is never counted twice.
+APPLY_LUA = """
+local applied = 0
+for e = 0, (#KEYS - 1) / 3 - 1 do
+    local k, a = 2 + e * 3, 3 + e * 8
+    local id, user_id, kind, service, cost = ARGV[a], ARGV[a + 1], ARGV[a + 2], ARGV[a + 3], ARGV[a + 4]
+    if redis.call('XACK', KEYS[1], ARGV[1], id) == 1 then
+        if kind == 'debit' then
+            redis.call('HINCRBY', KEYS[k], 'debited', cost)
+            redis.call('HINCRBY', KEYS[k], service .. ':cost', cost)
+            redis.call('HINCRBY', KEYS[k], service .. ':count', 1)
+        else
+            redis.call('HINCRBY', KEYS[k], 'credited', cost)
+        end
+        redis.call('ZADD', KEYS[k + 1], ARGV[a + 7], ARGV[a + 6])
+        redis.call('XADD', KEYS[k + 2], 'MAXLEN', '~', ARGV[2], '*',
+            'event_id', id, 'kind', kind, 'service', service, 'cost', cost, 'timestamp', ARGV[a + 5])
+        applied = applied + 1
+    end
+end
+return applied
+"""
+
+class CreditRollupWorker:
+    """
+    Folds the credit_events stream into per-user aggregates.
+
+    Events are read through a consumer group, so several API processes share
+    the work and events read by a process that dies are claimed by another
+    after claim_idle_ms. For every event the worker updates:
+
+    - credit_usage:{user}:{YYYY-MM}, a hash of debited and credited totals and
+      "{service}:cost" / "{service}:count" per service
+    - credit_months:{user}, the months with activity, scored YYYYMM
+    - credit_events:{user}, the user's recent events, capped at history_length
+
+    Dashboards read only these keys; the raw stream is trimmed by the ledger.
+    """
+    def __init__(self, batch_size: int = 100, history_length: int = CREDIT_HISTORY_LENGTH,
+                 claim_idle_ms: int = 60000, client: Optional[Redis] = None):
+        self.redis = client or Redis.from_url(
+            url=os.getenv("REDIS_URL", "redis://localhost:6379"),
+            decode_responses=True
+        )
+        self.batch_size = batch_size
+        self.history_length = history_length
+        self.claim_idle_ms = claim_idle_ms
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._apply_script = self.redis.register_script(APPLY_LUA)
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _ensure_group(self):
+        try:
+            await self.redis.xgroup_create(EVENTS_STREAM, ROLLUP_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def apply(self, entries) -> int:
+        """Folds stream entries [(id, fields)] into the rollups and acknowledges them"""
+        keys, args = [EVENTS_STREAM], [ROLLUP_GROUP, self.history_length]
+        trimmed = []
+        for event_id, fields in entries:
+            if not fields:
+                # Trimmed from the stream before it was processed
+                trimmed.append(event_id)
+                continue
+            user_id = fields["user_id"]
+            moment = datetime.fromtimestamp(int(event_id.split("-")[0]) / 1000, tz=timezone.utc)
+            month = moment.strftime("%Y-%m")
+            keys.extend([_usage_key(user_id, month), _months_key(user_id), _history_key(user_id)])
+            args.extend([
+                event_id, user_id, fields["kind"], fields["service"], fields["cost"],
+                fields.get("timestamp", ""), month, moment.year * 100 + moment.month
+            ])
+        if trimmed:
+            await self.redis.xack(EVENTS_STREAM, ROLLUP_GROUP, *trimmed)
+        if len(keys) == 1:
+            return 0
+        return await self._apply_script(keys=keys, args=args)
+
+    async def _run(self):
+        await self._ensure_group()
+        # Events this consumer read but never acknowledged come first
+        cursor = "0"
+        last_claim = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_claim > self.claim_idle_ms / 1000:
+                    last_claim = time.monotonic()
+                    _, claimed, *_ = await self.redis.xautoclaim(
+                        EVENTS_STREAM, ROLLUP_GROUP, self.consumer, self.claim_idle_ms, count=self.batch_size
+                    )
+                    await self.apply(claimed)
+
+                response = await self.redis.xreadgroup(
+                    ROLLUP_GROUP, self.consumer, {EVENTS_STREAM: cursor},
+                    count=self.batch_size, block=5000 if cursor == ">" else None
+                )
+                entries = response[0][1] if response else []
+                if cursor == "0" and not entries:
+                    cursor = ">"
+                    continue
+                await self.apply(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Credit rollup error: {e}")
+                await asyncio.sleep(1)
+
+async def history_page(redis: Redis, user_id: str, before: Optional[str] = None, limit: int = 50) -> dict:
+    """Returns a user's events newest first, and the cursor of the next page"""
+    entries = await redis.xrevrange(_history_key(user_id), max=f"({before}" if before else "+", min="-", count=limit)
+    return {
+        "events": [
+            {"id": event_id, "kind": fields["kind"], "service": fields["service"],
+             "cost": int(fields["cost"]), "timestamp": float(fields["timestamp"] or 0)}
+            for event_id, fields in entries
+        ],
+        "next_before": entries[-1][0] if len(entries) == limit else None
+    }
+
+def _summary(month: str, usage: dict) -> dict:
+    services = {}
+    for field, value in usage.items():
+        if ":" in field:
+            service, measure = field.rsplit(":", 1)
+            services.setdefault(service, {"cost": 0, "count": 0})[measure] = int(value)
+    return {
+        "month": month,
+        "debited": int(usage.get("debited", 0)),
+        "credited": int(usage.get("credited", 0)),
+        "services": services
+    }
+
+async def monthly_summaries(redis: Redis, user_id: str, months: int = 12) -> list:
+    """Returns the rollups of the user's most recent months with activity, newest first"""
+    recent = await redis.zrevrange(_months_key(user_id), 0, months - 1)
+    async with redis.pipeline(transaction=False) as pipe:
+        for month in recent:
+            pipe.hgetall(_usage_key(user_id, month))
+        usages = await pipe.execute()
+    return [_summary(month, usage) for month, usage in zip(recent, usages)]
+
+async def monthly_summary(redis: Redis, user_id: str, month: str) -> dict:
+    """Returns the rollup of one month, formatted YYYY-MM"""
+    return _summary(month, await redis.hgetall(_usage_key(user_id, month)))
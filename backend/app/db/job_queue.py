@@ -0,0 +1,156 @@
+from redis.asyncio import Redis
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import List, Optional
+
+# KEYS[1] pending list, KEYS[2] processing list
+# ARGV[1] lease key prefix, ARGV[2] lease seconds
+# Claims the oldest pending job and takes its lease in one step, so
+# requeue_stale never sees a claimed job without a lease.
+# Returns the raw job, or nil when the queue is empty.
+CLAIM_LUA = """
+local raw = redis.call('LMOVE', KEYS[1], KEYS[2], 'RIGHT', 'LEFT')
+if not raw then
+    return false
+end
+local job = cjson.decode(raw)
+redis.call('SET', ARGV[1] .. job['id'], raw, 'EX', tonumber(ARGV[2]))
+return raw
+"""
+
+# KEYS[1] processing list, KEYS[2] delayed set, KEYS[3] dead list
+# ARGV[1] lease key prefix, ARGV[2] now, ARGV[3] max attempts, ARGV[4] backoff seconds
+# Takes every processing job whose lease has expired out of the processing
+# list and counts it as a failed attempt, as fail() does: it is scheduled for
+# a retry with backoff, or dead-lettered once it has used its attempts.
+# Returns the raw jobs that were dead-lettered.
+REQUEUE_STALE_LUA = """
+local now, max_attempts, backoff = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local dead = {}
+for _, raw in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+    local job = cjson.decode(raw)
+    if redis.call('EXISTS', ARGV[1] .. job['id']) == 0 and redis.call('LREM', KEYS[1], 1, raw) > 0 then
+        job['attempts'] = job['attempts'] + 1
+        local updated = cjson.encode(job)
+        if job['attempts'] < max_attempts then
+            redis.call('ZADD', KEYS[2], now + backoff * 2 ^ (job['attempts'] - 1), updated)
+        else
+            redis.call('LPUSH', KEYS[3], updated)
+            table.insert(dead, updated)
+        end
+    end
+end
+return dead
+"""
+
+class RedisJobQueue:
+    """
+    Durable job queue backed by Redis.
+
+    Pending jobs live in a list. A worker moves a job into the processing
+    list and takes a short lease on it in one atomic step, and renews the
+    lease while the job runs, so jobs of a crashed worker are put back once
+    their lease expires. Failed jobs, and jobs whose lease expired, are
+    retried with exponential backoff through a delayed sorted set until they
+    have used max_attempts, then moved to the dead list.
+    """
+    def __init__(self, name: str, max_attempts: int = 3, lease_seconds: int = 60, backoff_seconds: float = 5.0,
+                 poll_seconds: float = 0.5):
+        self.redis = Redis.from_url(
+            url=os.getenv("REDIS_URL"),
+            decode_responses=True
+        )
+        self.name = name
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.backoff_seconds = backoff_seconds
+        self.poll_seconds = poll_seconds
+
+        self.pending_key = f"queue:{name}:pending"
+        self.processing_key = f"queue:{name}:processing"
+        self.delayed_key = f"queue:{name}:delayed"
+        self.dead_key = f"queue:{name}:dead"
+        self._claim = self.redis.register_script(CLAIM_LUA)
+        self._requeue_stale = self.redis.register_script(REQUEUE_STALE_LUA)
+
+    def _lease_key(self, job_id: str) -> str:
+        return f"queue:{self.name}:lease:{job_id}"
+
+    async def enqueue(self, payload: dict, job_id: Optional[str] = None) -> str:
+        """Add a job to the queue and return its id"""
+        job = {
+            "id": job_id or str(uuid.uuid4()),
+            "payload": payload,
+            "attempts": 0,
+            "enqueued_at": time.time()
+        }
+        await self.redis.lpush(self.pending_key, json.dumps(job))
+        return job["id"]
+
+    async def dequeue(self, timeout: int = 5) -> Optional[tuple]:
+        """
+        Wait up to timeout seconds for a job, returns (raw, job) or None.
+        Scripts cannot block, so an empty queue is polled every poll_seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            raw = await self._claim(
+                keys=[self.pending_key, self.processing_key],
+                args=[self._lease_key(""), self.lease_seconds]
+            )
+            if raw is not None:
+                return raw, json.loads(raw)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(self.poll_seconds, remaining))
+
+    async def heartbeat(self, job: dict):
+        """Extend the lease of a running job"""
+        await self.redis.expire(self._lease_key(job["id"]), self.lease_seconds)
+
+    async def ack(self, raw: str, job: dict):
+        """Mark a job as done"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(self.processing_key, 1, raw)
+            pipe.delete(self._lease_key(job["id"]))
+            await pipe.execute()
+
+    async def fail(self, raw: str, job: dict) -> bool:
+        """Schedule a retry for a failed job, returns False once attempts are exhausted"""
+        job["attempts"] += 1
+        retry = job["attempts"] < self.max_attempts
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(self.processing_key, 1, raw)
+            pipe.delete(self._lease_key(job["id"]))
+            if retry:
+                ready_at = time.time() + self.backoff_seconds * (2 ** (job["attempts"] - 1))
+                pipe.zadd(self.delayed_key, {json.dumps(job): ready_at})
+            else:
+                pipe.lpush(self.dead_key, json.dumps(job))
+            await pipe.execute()
+        return retry
+
+    async def promote_delayed(self):
+        """Move retries whose backoff has elapsed back to the pending list"""
+        due = await self.redis.zrangebyscore(self.delayed_key, 0, time.time())
+        for raw in due:
+            # zrem guards against another worker promoting the same job
+            if await self.redis.zrem(self.delayed_key, raw):
+                await self.redis.rpush(self.pending_key, raw)
+
+    async def requeue_stale(self) -> List[dict]:
+        """
+        Count jobs whose worker stopped renewing the lease (e.g. it crashed) as
+        failed attempts, so a job that keeps killing its worker ends up dead
+        instead of being retried forever. Returns the jobs dead-lettered.
+        """
+        dead = await self._requeue_stale(
+            keys=[self.processing_key, self.delayed_key, self.dead_key],
+            args=[self._lease_key(""), time.time(), self.max_attempts, self.backoff_seconds]
+        )
+        return [json.loads(raw) for raw in dead]
@@ -0,0 +1,64 @@
+from redis.asyncio import Redis
+import math
+import os
+import time
+from typing import List, Optional, Tuple
+
+# KEYS: one hash per bucket (tokens, updated_at)
+# ARGV[1] now in ms, ARGV[2] tokens to take, then (capacity, refill per second) per bucket.
+# Tokens are taken from every bucket or from none.
+# Returns {allowed (1/0), ms until the request would be allowed}
+TOKEN_BUCKET_LUA = """
+local now, cost = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tokens, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[1 + i * 2]), tonumber(ARGV[2 + i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local available = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    available = math.min(capacity, available + elapsed * rate / 1000)
+    tokens[i] = available
+    if available < cost then
+        wait = math.max(wait, math.ceil((cost - available) * 1000 / rate))
+    end
+end
+if wait > 0 then
+    return {0, wait}
+end
+for i, key in ipairs(KEYS) do
+    local capacity, rate = tonumber(ARGV[1 + i * 2]), tonumber(ARGV[2 + i * 2])
+    redis.call('HSET', key, 'tokens', tokens[i] - cost, 'updated_at', now)
+    -- An idle bucket is full again after capacity / rate seconds, and a missing bucket reads as full
+    redis.call('PEXPIRE', key, math.ceil(capacity * 1000 / rate))
+end
+return {1, 0}
+"""
+
+class TokenBucketLimiter:
+    """
+    Token buckets kept in Redis, so limits hold across every API process.
+    A request draws from several buckets at once (e.g. its user's and the
+    route's global one), atomically through a Lua script: it is admitted
+    only if all of them have tokens left.
+    """
+    def __init__(self, prefix: str = "ratelimit", client: Optional[Redis] = None):
+        self.redis = client or Redis.from_url(
+            url=os.getenv("REDIS_URL", "redis://localhost:6379"),
+            decode_responses=True
+        )
+        self.prefix = prefix
+        self._take = self.redis.register_script(TOKEN_BUCKET_LUA)
+
+    async def acquire(self, buckets: List[Tuple[str, int, float]], cost: int = 1) -> Tuple[bool, int]:
+        """
+        Takes cost tokens from each (name, capacity, refill per second) bucket.
+        Returns (allowed, seconds to wait before retrying).
+        """
+        if not buckets:
+            return True, 0
+        keys = [f"{self.prefix}:{name}" for name, _, _ in buckets]
+        args = [int(time.time() * 1000), cost]
+        for _, capacity, rate in buckets:
+            args.extend([capacity, rate])
+        allowed, wait_ms = await self._take(keys=keys, args=args)
+        return bool(allowed), math.ceil(int(wait_ms) / 1000)
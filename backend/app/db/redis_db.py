@@ -3,6 +3,7 @@ import os
 from redis import Redis
 from ..config import settings
 from typing import List
+from datetime import datetime
 
 class RedisClient:
     def __init__(self):
@@ -41,4 +42,24 @@ class RedisClient:
                 cases.append(case_data)
         return cases
 
+    def set_verification_status(self, case_id: str, **fields):
+        """Updates the content verification job record of a case"""
+        fields["updated_at"] = datetime.now().astimezone().strftime("%d-%m-%Y %H:%M:%S %Z")
+        mapping = {
+            key: json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+            for key, value in fields.items()
+        }
+        self.redis.hset(f"verification:{case_id}", mapping=mapping)
+
+    def get_verification_status(self, case_id: str):
+        data = self.redis.hgetall(f"verification:{case_id}")
+        if not data:
+            return None
+        if "results" in data:
+            data["results"] = json.loads(data["results"])
+        return data
+
+    def delete_verification_status(self, case_id: str):
+        self.redis.delete(f"verification:{case_id}")
+
 redis_client = RedisClient() 
\ No newline at end of file
@@ -1,33 +1,29 @@
-from fastapi import FastAPI, HTTPException
-from transformers import pipeline, AutoTokenizer
+from fastapi import HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
 import os
 from dotenv import load_dotenv
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, Settings
 from ..config import settings
-from phi.model.google import Gemini
-from dotenv import load_dotenv
-from phi.agent import Agent, RunResponse
-from phi.knowledge.llamaindex import LlamaIndexKnowledgeBase
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from io import BytesIO
+from phi.agent import RunResponse
+from ..llm.admission import LLMOverloaded
+from ..llm.resilience import call_llm
 import re
 from ..db.redis_db import redis_client
+from ..ml.model_cache import get_pipeline
+from ..ml.embedding import get_embedding_service
+from ..ml.scoring import get_score_model, response_features, score_auditor
+from .memory import ConversationMemory
+from ..retrieval.vector_store import PersistedVectorStore, documents_to_nodes
+from ..consultancy.consultancy import get_statute_retriever
 
 load_dotenv()
 
-# Configure OpenAI settings
-Settings.chunk_size = 512
-Settings.chunk_overlap = 50
-Settings.embed_model = HuggingFaceEmbedding(
-    model_name="all-MiniLM-L6-v2"
-)
+# Chunking of the per-case overlay index
+CHUNK_SIZE = 512
+CHUNK_OVERLAP = 50
+
+SENTIMENT_MODEL = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+COHERENCE_MODEL = "textattack/bert-base-uncased-snli"
 
 # Pydantic Models
 class LawyerContext(BaseModel):
@@ -68,6 +64,10 @@ class VectorDBMixin:
         # print(f"Loading documents from: {data_dir}")  # Debug print
         try:
             # Add more file types and configure reader
+            from llama_index.core import SimpleDirectoryReader
+            from ..retrieval.retriever import StoreRetriever
+            from ..retrieval.federated import FederatedRetriever
+
             documents = SimpleDirectoryReader(
                 input_dir=data_dir,
                 recursive=True,
@@ -82,27 +82,50 @@ class VectorDBMixin:
                 raise ValueError(f"No documents found in {data_dir}")
             
             # Configure chunking for better context
-            self.index = VectorStoreIndex.from_documents(documents)
-            self.retriever = self.index.as_retriever()
+            self.index = PersistedVectorStore.build(
+                documents_to_nodes(documents, CHUNK_SIZE, CHUNK_OVERLAP),
+                get_embedding_service(),
+                keep_full_precision=False
+            )
+            self.case_retriever = StoreRetriever(self.index, get_embedding_service(), similarity_top_k=2)
+            self.retriever = FederatedRetriever(self._statute_retriever(), self.case_retriever)
             
         except Exception as e:
             print(f"Error loading documents: {e}")
             raise
 
+    def retrieved_passages(self, query, limit=3):
+        """The passages retrieved for query, used in place of an answer when the LLM is unavailable"""
+        results = self.retriever.retrieve(query)[:limit]
+        return "\n\n".join(result.node.get_content() for result in results)
+
+    def case_evidence(self, query, limit=3):
+        """
+        The case-document passages already retrieved for this turn (statutes
+        left out), as the evidence an argument is scored against. The case
+        documents are searched for query only if the turn retrieved none.
+        """
+        nodes = [result.node for result in self.retriever.retrieved if result.node.metadata.get("source") == "case"]
+        if not nodes:
+            nodes = [result.node for result in self.case_retriever.retrieve(query)]
+        unique = list({node.node_id: node for node in nodes}.values())[:limit]
+        return "\n\n".join(node.get_content() for node in unique)
+
+    @staticmethod
+    def _statute_retriever():
+        """The shared statute index, or None when it cannot be loaded"""
+        try:
+            return get_statute_retriever()
+        except Exception as e:
+            print(f"Statute index unavailable, using case documents only: {e}")
+            return None
+
 class HumanAssistant(VectorDBMixin):
     def __init__(self,case_id:str):
         super().__init__(case_id)
         # Initialize knowledge base
+        from phi.knowledge.llamaindex import LlamaIndexKnowledgeBase
         self.knowledge_base = LlamaIndexKnowledgeBase(retriever=self.retriever)
-        
-        # Initialize agents with Galadriel
-                    # self.summarising_agent = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")),
-            #knowledge_base=self.knowledge_base, search_knowledge=True)
-        # print("initializing the agent for the same")
-        self.summarising_agent = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")),knowledge_base=self.knowledge_base, search_knowledge=True)
-        
-        self.context_checker = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")))
-        # print("initailized the agent for the same")
 
     def ask(self,user_input):
         context_needed = self.check_context_need(user_input)
@@ -151,7 +174,10 @@ class HumanAssistant(VectorDBMixin):
                 "- Note any recent changes in relevant law or pending legislation"
                 "- Include any ethical considerations or potential conflicts"
             )
-            run: RunResponse = self.summarising_agent.run(prompt)
+            run: RunResponse = call_llm(
+                "summarising_agent", prompt, knowledge=self.knowledge_base, search_knowledge=True,
+                fallback=lambda: self.retrieved_passages(user_input)
+            )
             summarized_response = run.content
             return [user_input,summarized_response]
         else:
@@ -168,7 +194,8 @@ class HumanAssistant(VectorDBMixin):
         )
         
         # Run the context checker with the refined prompt
-        run: RunResponse = self.context_checker.run(prompt)
+        # Without the model, skip the research step rather than wait for it
+        run: RunResponse = call_llm("context_checker", prompt, fallback=lambda: "no")
         decision = run.content.strip()
         
         # Use regular expressions to check for 'yes' or 'no' responses
@@ -180,13 +207,12 @@ class HumanAssistant(VectorDBMixin):
 class AILawyer(VectorDBMixin):
     def __init__(self,case_id:str):
         super().__init__(case_id)  # Initialize vector database
+        from phi.knowledge.llamaindex import LlamaIndexKnowledgeBase
         self.knowledge_base = LlamaIndexKnowledgeBase(retriever=self.retriever)
-        # self.RagAgent = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")),knowledge_base=self.knowledge_base, search_knowledge=True)
-        self.RagAgent = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")),knowledge_base=self.knowledge_base, search_knowledge=True)
 
-    def respond(self, query):
+    def respond(self, query, history=""):
         # Generate response using insights
-        generated_response = self.generate_response_with_insights(query)
+        generated_response = self.generate_response_with_insights(query, history)
         
         return {
             "input": "AI Lawyer's Argument",
@@ -194,7 +220,9 @@ class AILawyer(VectorDBMixin):
             "speaker": "ai"
         }
 
-    def generate_response_with_insights(self, query):
+    def generate_response_with_insights(self, query, history=""):
+        # The trial so far, as kept by the judge's bounded ConversationMemory
+        trial_record = f"\nThe trial so far:\n{history}\n" if history else ""
         prompt = (
             "You are an experienced trial attorney with 20+ years of litigation experience across civil and criminal law. "
             "Core traits and capabilities:"
@@ -202,6 +230,7 @@ class AILawyer(VectorDBMixin):
             "- Expert in evidence law, procedural rules, and relevant jurisdictional precedents"
             "- Adapts communication style appropriately while maintaining professionalism"
             "\nContext and Role:"
+            f"{trial_record}"
             f"The following is a statement from opposing counsel: {query}"
             "\nResponse Parameters:"
             "1. Match the formality level of opposing counsel while staying within professional bounds"
@@ -222,7 +251,10 @@ class AILawyer(VectorDBMixin):
             "4. Factually accurate based on available information"
         )
 
-        run: RunResponse = self.RagAgent.run(prompt)
+        run: RunResponse = call_llm(
+            "RagAgent", prompt, knowledge=self.knowledge_base, search_knowledge=True,
+            fallback=lambda: "Counsel relies on the following material from the record:\n\n" + self.retrieved_passages(query)
+        )
 
         return run.content
 
@@ -249,17 +281,23 @@ class Judge:
         self.human1_score = 0
         self.human2_score = 0
         
-        # Initialize sentiment analysis pipelines
-        self.sentiment_analyzer = pipeline("sentiment-analysis", model="distilbert/distilbert-base-uncased-finetuned-sst-2-english")
-        self.coherence_model = pipeline("text-classification", model="textattack/bert-base-uncased-snli")
-        self.tokenizer = AutoTokenizer.from_pretrained("distilbert-base-uncased")
         self.current_turn = None  # Track whose turn it is
-        # self.judge = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")))
-        self.judge = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")))        # self.score_analyser = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")))
-        self.score_analyser = Agent(model=Gemini(id="gemini-2.0-flash-exp", api_key=os.getenv("GOOGLE_API_KEY")))
-
-    def analyze_response(self, response, is_human):
-        """Enhanced response analysis with chunking"""
+        self.memory = ConversationMemory()  # what the AI lawyer remembers of the trial
+
+    # Scoring pipelines are shared by every Judge and loaded on first use
+    @property
+    def sentiment_analyzer(self):
+        return get_pipeline("sentiment-analysis", SENTIMENT_MODEL)
+
+    @property
+    def coherence_model(self):
+        return get_pipeline("text-classification", COHERENCE_MODEL)
+
+    def analyze_response(self, response, is_human, evidence=""):
+        """
+        Scores an argument locally from its expression, its coherence with the
+        previous turn, its overlap with the case evidence and its length
+        """
         def analyze_in_chunks(text, analyzer):
             if len(text) > 500:
                 chunks = [text[i:i + 500] for i in range(0, len(text), 500)]
@@ -282,21 +320,22 @@ class Judge:
             coherence_input = f"{previous_response} {response}"
             coherence_score = analyze_in_chunks(coherence_input, self.coherence_model)
 
-        final_score = (expression_score + coherence_score) / 2
-        prompt = f"Based on the score calculated which is {final_score} and the input {response} generate a score between 0 and 1. Make sure that if the response is not that good or it is very bad then the score is low regardless of the score calculated. Make sure only the score in the form of numbers is given as output and nothing else."
-        run: RunResponse = self.score_analyser.run(prompt)
-        extracted_number = float(run.content)
+        features = response_features(response, expression_score, coherence_score, evidence)
+        score = get_score_model().score(features)
+        # A sample of turns is also scored by the LLM, off the turn's path, to recalibrate against
+        score_auditor.submit(response, features, score)
 
         if is_human:
-            self.human_score += extracted_number
+            self.human_score += score
         else:
-            self.ai_score += extracted_number
+            self.ai_score += score
             
-        return extracted_number
+        return score
 
     async def start_simulation(self):
         """Initialize a new simulation and return initial state"""
         self.conversations = []
+        self.memory = ConversationMemory()
         self.human_score = 0
         self.ai_score = 0
         
@@ -344,7 +383,10 @@ class Judge:
                 
                 human_lawyer = HumanLawyer(request.case_id)
                 response = human_lawyer.ask(request.input_text)
-                score = self.analyze_response(response.input, is_human=True)
+                score = self.analyze_response(
+                    response.input, is_human=True,
+                    evidence=human_lawyer.assistant.case_evidence(response.input)
+                )
                 
                 # Create human's response
                 human_response = LawyerContext(
@@ -356,6 +398,7 @@ class Judge:
                 
                 # Add to conversation and PDF
                 self.conversations.append(human_response)
+                self.memory.add("human", request.input_text)
                 #self.append_to_case_pdf(request.case_id, human_response)
                 
                 # Generate and add judge's commentary
@@ -381,8 +424,14 @@ class Judge:
                 
             else:  # AI turn
                 ai_lawyer = AILawyer(request.case_id)
-                ai_response_data = ai_lawyer.respond(request.input_text) # or else let it be self.conversations[-2]
-                score = self.analyze_response(ai_response_data["context"], is_human=False)
+                ai_response_data = ai_lawyer.respond(
+                    request.input_text,
+                    history=self.memory.render(exclude=request.input_text)
+                )
+                score = self.analyze_response(
+                    ai_response_data["context"], is_human=False,
+                    evidence=ai_lawyer.case_evidence(ai_response_data["context"])
+                )
                 
                 # Create AI's response
                 ai_response = LawyerContext(
@@ -394,6 +443,7 @@ class Judge:
                 
                 # Add to conversation and PDF
                 self.conversations.append(ai_response)
+                self.memory.add("ai", ai_response.input)
                 #self.append_to_case_pdf(request.case_id, ai_response)
                 
                 # Generate and add judge's commentary
@@ -418,6 +468,9 @@ class Judge:
                     judge_comment=judge_comment.input
                 )
 
+        except (HTTPException, LLMOverloaded):
+            # Keep their status codes; LLMOverloaded becomes a 503 in main.py
+            raise
         except Exception as e:
             print(f"Error processing input: {e}")
             raise HTTPException(
@@ -473,7 +526,7 @@ class Judge:
         )
         
         try:
-            run: RunResponse = self.judge.run(prompt)
+            run: RunResponse = call_llm("judge", prompt, single_flight=True)
             comment = run.content
             next_speaker = "AI" if self.current_turn == "ai" else "Human"
             
@@ -502,7 +555,7 @@ class Judge:
         )
         
         try:
-            run: RunResponse = self.judge.run(prompt)
+            run: RunResponse = call_llm("judge", prompt, single_flight=True)
             response = run.content
             
             return LawyerContext(
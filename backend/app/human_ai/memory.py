@@ -0,0 +1,112 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from ..api.content_verification.chunking import clip_tokens
+from ..llm.resilience import call_llm
+
+# Most recent turns kept verbatim in the AI lawyer's prompt
+HAI_MEMORY_TURNS = int(os.getenv("HAI_MEMORY_TURNS", "6"))
+# Older turns are folded into the running summary this many at a time
+HAI_MEMORY_SUMMARY_EVERY = int(os.getenv("HAI_MEMORY_SUMMARY_EVERY", "4"))
+# Token caps on the running summary and on each verbatim turn
+HAI_MEMORY_SUMMARY_TOKENS = int(os.getenv("HAI_MEMORY_SUMMARY_TOKENS", "400"))
+HAI_MEMORY_TURN_TOKENS = int(os.getenv("HAI_MEMORY_TURN_TOKENS", "300"))
+
+SPEAKERS = {"human": "Human lawyer", "ai": "AI lawyer"}
+
+# Summaries are refreshed off the turn's path
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hai-memory")
+
+def _format(turns: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"[{SPEAKERS.get(speaker, speaker)}] {text}" for speaker, text in turns)
+
+def _first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+
+class ConversationMemory:
+    """
+    What the AI lawyer remembers of a trial: the last `turns` turns verbatim,
+    and a running summary of everything before them. Turns leaving the
+    verbatim window wait in `pending` (still verbatim) until `summary_every`
+    of them have gathered; they are then folded into the summary in the
+    background. Every part is capped in tokens, so the prompt stays the same
+    size however long the trial runs.
+    """
+    def __init__(self, turns: int = HAI_MEMORY_TURNS, summary_every: int = HAI_MEMORY_SUMMARY_EVERY,
+                 summary_tokens: int = HAI_MEMORY_SUMMARY_TOKENS, turn_tokens: int = HAI_MEMORY_TURN_TOKENS):
+        self.turns = turns
+        self.summary_every = summary_every
+        self.summary_tokens = summary_tokens
+        self.turn_tokens = turn_tokens
+        self.summary = ""
+        self.pending = []  # (speaker, text) turns awaiting summarisation, oldest first
+        self.recent = []   # (speaker, text) turns kept verbatim, oldest first
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def add(self, speaker: str, text: str):
+        with self._lock:
+            self.recent.append((speaker, clip_tokens(text, self.turn_tokens)))
+            while len(self.recent) > self.turns:
+                self.pending.append(self.recent.pop(0))
+            if len(self.pending) < self.summary_every:
+                return
+            if len(self.pending) >= 2 * self.summary_every:
+                # The summariser has fallen behind; fold without it to keep the prompt bounded
+                folded, self.pending = self.pending, []
+                self.summary = self._extract(self.summary, folded)
+                return
+            if self._refreshing:
+                return
+            self._refreshing = True
+            summary, folded = self.summary, list(self.pending)
+        _executor.submit(self._refresh, summary, folded)
+
+    def _refresh(self, summary: str, folded: List[Tuple[str, str]]):
+        try:
+            updated = self.summarise(summary, folded)
+        except Exception as e:
+            print(f"Conversation summary failed: {e}")
+            updated = self._extract(summary, folded)
+        with self._lock:
+            # The turns may already have been folded by the fallback above
+            if self.pending[:len(folded)] == folded:
+                self.pending = self.pending[len(folded):]
+                self.summary = updated
+            self._refreshing = False
+
+    def summarise(self, summary: str, folded: List[Tuple[str, str]]) -> str:
+        words = int(self.summary_tokens * 0.7)
+        prompt = (
+            "You keep the running record of a courtroom simulation for counsel. "
+            "Update the summary of the proceedings with the new exchanges below. "
+            "Keep every claim, piece of evidence, objection and concession that may matter later, and which side made it; "
+            f"drop courtesies and repetition. Write at most {words} words of plain prose."
+            f"\nCurrent summary:\n{summary or 'The trial has just begun.'}"
+            f"\nNew exchanges:\n{_format(folded)}"
+        )
+        run = call_llm("memory_summariser", prompt, fallback=lambda: self._extract(summary, folded))
+        return clip_tokens(run.content.strip(), self.summary_tokens)
+
+    def _extract(self, summary: str, folded: List[Tuple[str, str]]) -> str:
+        """Cheap summary without the LLM: the opening sentence of each turn, oldest dropped first"""
+        notes = _format([(speaker, _first_sentence(text)) for speaker, text in folded])
+        return clip_tokens(f"{summary}\n{notes}".strip(), self.summary_tokens, keep_end=True)
+
+    def render(self, exclude: Optional[str] = None) -> str:
+        """
+        The memory as prompt text. exclude drops the latest turn if it is that
+        text, e.g. the statement the prompt is already answering.
+        """
+        with self._lock:
+            summary, turns = self.summary, self.pending + self.recent
+        if turns and exclude is not None and turns[-1][1] == clip_tokens(exclude, self.turn_tokens):
+            turns = turns[:-1]
+        parts = []
+        if summary:
+            parts.append(f"Summary of the earlier proceedings:\n{summary}")
+        if turns:
+            parts.append(f"Most recent exchanges, oldest first:\n{_format(turns)}")
+        return "\n\n".join(parts)
@@ -0,0 +1,30 @@
+import os
+import threading
+from contextlib import contextmanager
+
+# Outbound LLM calls in flight at once in this process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Seconds a call may wait for a free slot before it is shed
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "5"))
+
+class LLMOverloaded(Exception):
+    """Raised when no LLM slot frees up in time; the caller should retry after retry_after seconds"""
+    def __init__(self, retry_after: int = 5):
+        super().__init__(f"LLM capacity exhausted, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+@contextmanager
+def llm_slot(timeout: float = LLM_QUEUE_TIMEOUT):
+    """
+    Holds one of the process' LLM slots. Once all are taken, callers queue
+    for at most timeout seconds and are then shed with LLMOverloaded, rather
+    than piling onto a saturated provider and stretching everyone's latency.
+    """
+    if not _slots.acquire(timeout=timeout):
+        raise LLMOverloaded(max(1, round(timeout)))
+    try:
+        yield
+    finally:
+        _slots.release()
@@ -0,0 +1,76 @@
+import os
+import threading
+from typing import List, Optional
+import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from phi.model.google import Gemini
+from phi.model.message import Message
+
+# Seconds between HTTP/2 keep-alive pings on the shared Gemini connection, and
+# how long to wait for the ping's answer before the connection is replaced
+LLM_KEEPALIVE_TIME = float(os.getenv("LLM_KEEPALIVE_TIME", "30"))
+LLM_KEEPALIVE_TIMEOUT = float(os.getenv("LLM_KEEPALIVE_TIMEOUT", "10"))
+
+KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_time_ms", int(LLM_KEEPALIVE_TIME * 1000)),
+    ("grpc.keepalive_timeout_ms", int(LLM_KEEPALIVE_TIMEOUT * 1000)),
+    # Keep pinging while idle between turns, so the next call finds the connection warm
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+_clients = {}  # api key -> GenerativeServiceClient
+_clients_lock = threading.Lock()
+
+def _grpc_transport(**kwargs):
+    transport_class = glm.GenerativeServiceClient.get_transport_class("grpc")
+
+    def channel(host, options=(), **channel_kwargs):
+        return transport_class.create_channel(host, options=list(options) + KEEPALIVE_OPTIONS, **channel_kwargs)
+
+    return transport_class(channel=channel, **kwargs)
+
+def shared_client(api_key: str) -> glm.GenerativeServiceClient:
+    """
+    The process' one Gemini client. Its gRPC channel is a single HTTP/2
+    connection that multiplexes every concurrent call (at most
+    LLM_MAX_CONCURRENCY of them, see admission.py) and is kept alive between
+    calls, so TLS is negotiated once per process rather than once per call.
+    """
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = glm.GenerativeServiceClient(
+                transport=_grpc_transport,
+                client_options={"api_key": api_key}
+            )
+        return _clients[api_key]
+
+class SharedClientGemini(Gemini):
+    """
+    phi's Gemini calls genai.configure() on every request, which discards
+    google.generativeai's cached clients and with them the open connection.
+    This one sends every request through shared_client() instead, and gives
+    up on a request after request_timeout seconds (set per call by resilience.py).
+    """
+    request_timeout: Optional[float] = None
+
+    def get_client(self) -> genai.GenerativeModel:
+        model = genai.GenerativeModel(model_name=self.id, **self.request_kwargs)
+        model._client = shared_client(self.api_key or os.getenv("GOOGLE_API_KEY"))
+        return model
+
+    def _request_options(self):
+        return {"timeout": self.request_timeout} if self.request_timeout else None
+
+    def invoke(self, messages: List[Message]):
+        return self.get_client().generate_content(
+            contents=self._format_messages(messages),
+            request_options=self._request_options()
+        )
+
+    def invoke_stream(self, messages: List[Message]):
+        yield from self.get_client().generate_content(
+            contents=self._format_messages(messages),
+            stream=True,
+            request_options=self._request_options()
+        )
@@ -0,0 +1,65 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+from phi.agent import Agent
+from .admission import LLM_MAX_CONCURRENCY
+from .providers import get_model
+
+# Idle agents kept per role; more can be checked out at once, the extra ones are not kept
+LLM_AGENT_POOL_SIZE = int(os.getenv("LLM_AGENT_POOL_SIZE", str(LLM_MAX_CONCURRENCY)))
+
+class AgentPool:
+    """
+    Agents for one role, built once and reused across requests. An agent is
+    used by one caller at a time (phi keeps per-run state on it) and its
+    memory is cleared when it comes back, so nothing leaks between requests.
+    """
+    def __init__(self, factory: Callable[[], Agent], size: int = LLM_AGENT_POOL_SIZE):
+        self.factory = factory
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    @contextmanager
+    def agent(self, knowledge=None):
+        try:
+            agent = self._idle.get_nowait()
+        except queue.Empty:
+            agent = self.factory()
+        agent.knowledge = knowledge
+        try:
+            yield agent
+        finally:
+            agent.memory.clear()
+            agent.knowledge = None  # don't keep a case's index alive
+            try:
+                self._idle.put_nowait(agent)
+            except queue.Full:
+                pass
+
+# (agent_kwargs, pool) per role. kwargs such as tools or instructions are
+# often unhashable, so they are compared rather than used as dict keys.
+_pools: Dict[str, List[Tuple[dict, AgentPool]]] = {}
+_pools_lock = threading.Lock()
+
+def _pool(role: str, agent_kwargs: dict) -> AgentPool:
+    with _pools_lock:
+        pools = _pools.setdefault(role, [])
+        for kwargs, pool in pools:
+            if kwargs == agent_kwargs:
+                return pool
+        kwargs = dict(agent_kwargs)
+        pool = AgentPool(lambda: Agent(model=get_model(), **kwargs))
+        pools.append((kwargs, pool))
+        return pool
+
+@contextmanager
+def pooled_agent(role: str, knowledge=None, **agent_kwargs):
+    """
+    Checks out an Agent for role, built as Agent(model=get_model(), **agent_kwargs).
+    Agents are pooled per role and set of agent_kwargs, so callers of a role
+    that pass different tools, instructions or models never share agents.
+    knowledge, e.g. a case's knowledge base, is attached for this checkout only.
+    """
+    with _pool(role, agent_kwargs).agent(knowledge) as agent:
+        yield agent
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Tuple
+from phi.model.base import Model
+from phi.model.message import Message
+from phi.model.response import ModelResponse
+from pydantic import PrivateAttr
+
+# "gemini", or "fake" to run every agent against FakeModel, offline
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash-exp")
+# Delay before the first token, in seconds: "fixed:<s>", "uniform:<low>:<high>",
+# "normal:<mean>:<stddev>" or "lognormal:<median>:<sigma>"
+LLM_FAKE_LATENCY = os.getenv("LLM_FAKE_LATENCY", "fixed:0")
+# Rate the rest of a fake answer arrives at; 0 for all at once
+LLM_FAKE_TOKENS_PER_SECOND = float(os.getenv("LLM_FAKE_TOKENS_PER_SECOND", "0"))
+# Length of the free-text answers, in words
+LLM_FAKE_WORDS = int(os.getenv("LLM_FAKE_WORDS", "80"))
+# Seeds the latency draws, so a benchmark run can be replayed exactly
+LLM_FAKE_SEED = int(os.getenv("LLM_FAKE_SEED", "0"))
+# Optional JSON file of [{"match": "<regex>", "response": "<template>"}], tried before the built-in rules
+LLM_FAKE_RESPONSES = os.getenv("LLM_FAKE_RESPONSES")
+
+def latency_sampler(spec: str) -> Callable[[random.Random], float]:
+    """Parses a LLM_FAKE_LATENCY spec into a function drawing one delay in seconds"""
+    kind, *params = spec.split(":")
+    values = [float(param) for param in params]
+    samplers = {
+        "fixed": lambda rng: values[0],
+        "uniform": lambda rng: rng.uniform(values[0], values[1]),
+        "normal": lambda rng: rng.gauss(values[0], values[1]),
+        "lognormal": lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) if values[0] > 0 else 0.0,
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution {kind!r}, expected one of {sorted(samplers)}")
+    return lambda rng: max(0.0, samplers[kind](rng))
+
+LEGAL_SENTENCES = [
+    "The submission rests on the facts recorded in the case file.",
+    "Counsel has not shown that the evidence was obtained improperly.",
+    "The burden of proof remains with the prosecution throughout.",
+    "Section 300 of the Indian Penal Code sets out the ingredients of the offence.",
+    "The testimony of the witness is consistent with the documentary record.",
+    "Article 21 of the Constitution guarantees a fair procedure.",
+    "The precedent relied upon is distinguishable on its facts.",
+    "Any reasonable doubt must be resolved in favour of the accused.",
+    "The chain of custody of the exhibits has been maintained.",
+    "The court may draw an adverse inference from the omission.",
+    "The objection is noted and will be addressed in the final order.",
+    "Further particulars are required before the claim can be decided.",
+]
+
+def _legal_text(rng: random.Random, words: int) -> str:
+    sentences, count = [], 0
+    while count < words:
+        sentence = rng.choice(LEGAL_SENTENCES)
+        sentences.append(sentence)
+        count += len(sentence.split())
+    return " ".join(sentences)
+
+def _verdicts(prompt: str, rng: random.Random) -> str:
+    verdicts = []
+    for filename in re.findall(r'<document name="(.*?)">', prompt):
+        ai_percentage = round(rng.uniform(0, 40), 1)
+        verdicts.append({
+            "filename": filename,
+            "verdict": "rejected" if ai_percentage > 20 else "verified",
+            "ai_content_percentage": ai_percentage,
+            "confidence": rng.choice(["low", "medium", "high"]),
+            "rationale": _legal_text(rng, 20),
+        })
+    return json.dumps({"verdicts": verdicts})
+
+def _template_values(prompt: str, rng: random.Random) -> Dict[str, Any]:
+    return {
+        "score": f"{rng.uniform(0.3, 0.9):.2f}",
+        "yes_no": rng.choice(["yes", "no"]),
+        "text": _legal_text(rng, LLM_FAKE_WORDS),
+        "prompt": prompt[:200],
+    }
+
+# (pattern, answer) tried in order against the prompt; an answer is either a
+# str.format template over _template_values or a function of (prompt, rng)
+DEFAULT_RULES: List[Tuple[str, Any]] = [
+    (r'"verdicts"', _verdicts),
+    (r"only the score in the form of numbers", "{score}"),
+    (r"respond with 'yes'", "{yes_no}"),
+    (r"", "{text}"),
+]
+
+def load_rules(path: str = LLM_FAKE_RESPONSES) -> List[Tuple[str, Any]]:
+    rules = []
+    if path:
+        with open(path) as f:
+            rules = [(rule["match"], rule["response"]) for rule in json.load(f)]
+    return rules + DEFAULT_RULES
+
+def _tokens(text: str) -> List[str]:
+    # Words with their trailing whitespace, so the stream joins back into text
+    return re.findall(r"\S+\s*|\s+", text)
+
+class FakeModel(Model):
+    """
+    Deterministic stand-in for a hosted model. The answer is chosen by the
+    first rule whose pattern matches the prompt and is seeded by the prompt,
+    so the same prompt always gets the same answer. Latency and streaming
+    speed follow LLM_FAKE_LATENCY and LLM_FAKE_TOKENS_PER_SECOND. Tools are
+    never called.
+    """
+    id: str = "fake"
+    name: str = "FakeModel"
+    provider: str = "Fake"
+    latency: str = LLM_FAKE_LATENCY
+    tokens_per_second: float = LLM_FAKE_TOKENS_PER_SECOND
+    seed: int = LLM_FAKE_SEED
+    rules: List[Tuple[str, Any]] = []
+
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _sample: Callable[[random.Random], float] = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self.rules = self.rules or load_rules()
+        self._rng = random.Random(self.seed)
+        self._sample = latency_sampler(self.latency)
+
+    def answer(self, prompt: str) -> str:
+        rng = random.Random(prompt)
+        for pattern, response in self.rules:
+            if re.search(pattern, prompt, re.IGNORECASE):
+                if callable(response):
+                    return response(prompt, rng)
+                return response.format(**_template_values(prompt, rng))
+        return ""
+
+    def _first_token_delay(self) -> float:
+        with self._rng_lock:
+            return self._sample(self._rng)
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _prompt(self, messages: List[Message]) -> str:
+        for message in reversed(messages):
+            if message.role == "user":
+                return message.get_content_string()
+        return ""
+
+    def _reply(self, messages: List[Message]) -> str:
+        content = self.answer(self._prompt(messages))
+        messages.append(Message(role="assistant", content=content))
+        return content
+
+    def response(self, messages: List[Message]) -> ModelResponse:
+        content = self._reply(messages)
+        time.sleep(self._first_token_delay() + len(_tokens(content)) * self._token_delay())
+        return ModelResponse(content=content)
+
+    async def aresponse(self, messages: List[Message]) -> ModelResponse:
+        content = self._reply(messages)
+        await asyncio.sleep(self._first_token_delay() + len(_tokens(content)) * self._token_delay())
+        return ModelResponse(content=content)
+
+    def response_stream(self, messages: List[Message]) -> Iterator[ModelResponse]:
+        content = self._reply(messages)
+        time.sleep(self._first_token_delay())
+        for i, token in enumerate(_tokens(content)):
+            if i:
+                time.sleep(self._token_delay())
+            yield ModelResponse(content=token)
+
+    async def aresponse_stream(self, messages: List[Message]) -> AsyncIterator[ModelResponse]:
+        content = self._reply(messages)
+        await asyncio.sleep(self._first_token_delay())
+        for i, token in enumerate(_tokens(content)):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            yield ModelResponse(content=token)
+
+def _gemini(model_id: str) -> Model:
+    from .gemini import SharedClientGemini
+    return SharedClientGemini(id=model_id, api_key=os.getenv("GOOGLE_API_KEY"))
+
+PROVIDERS: Dict[str, Callable[[str], Model]] = {
+    "gemini": _gemini,
+    "fake": lambda model_id: FakeModel(id=f"fake-{model_id}"),
+}
+
+def register_provider(name: str, factory: Callable[[str], Model]):
+    """Makes factory(model_id) selectable with LLM_PROVIDER=name"""
+    PROVIDERS[name] = factory
+
+def get_model(model_id: str = LLM_MODEL) -> Model:
+    """A new phi model instance from the configured provider"""
+    if LLM_PROVIDER not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {LLM_PROVIDER!r}, expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[LLM_PROVIDER](model_id)
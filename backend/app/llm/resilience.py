@@ -0,0 +1,278 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+from phi.agent import RunResponse
+from ..constants.llm_policies import LLM_POLICIES
+from .admission import LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT, LLMOverloaded, llm_slot
+from .pool import pooled_agent
+from .single_flight import single_flight as _single_flight, prompt_key
+
+# Retries and hedges allowed, as a share of the calls made over the last window
+# seconds, plus a floor so a quiet process can still retry at all
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.1"))
+LLM_RETRY_BUDGET_MIN = int(os.getenv("LLM_RETRY_BUDGET_MIN", "5"))
+LLM_RETRY_BUDGET_WINDOW = float(os.getenv("LLM_RETRY_BUDGET_WINDOW", "10"))
+# Base delay of the jittered exponential backoff between attempts, in seconds
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+# Successful calls a role needs before its p95 is trusted for hedging
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Consecutive failures that open a role's circuit, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+class LLMUnavailable(LLMOverloaded):
+    """Raised when a role's calls miss their deadline or its circuit is open, and there is no fallback"""
+    def __init__(self, role: str, retry_after: int = 5):
+        super().__init__(retry_after)
+        self.args = (f"LLM calls for {role} are failing or too slow, retry in {retry_after}s",)
+
+class RetryBudget:
+    """
+    Caps retries and hedges at a share of recent calls. When the provider
+    degrades, every caller would otherwise retry at once and multiply the
+    load on it; with the budget spent, calls fail fast to their fallbacks.
+    """
+    def __init__(self, ratio: float = LLM_RETRY_BUDGET_RATIO, minimum: int = LLM_RETRY_BUDGET_MIN,
+                 window: float = LLM_RETRY_BUDGET_WINDOW):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for events in (self._calls, self._retries):
+            while events and events[0] < now - self.window:
+                events.popleft()
+
+    def record_call(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._calls.append(now)
+
+    def try_spend(self) -> bool:
+        """Takes one retry from the budget, if any is left"""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.minimum + self.ratio * len(self._calls):
+                return False
+            self._retries.append(now)
+            return True
+
+class LatencyTracker:
+    """Latencies of a role's recent successful calls"""
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failed calls. While open, calls are
+    refused (and go to their fallbacks) for `cooldown` seconds; then a single
+    trial call is let through, and its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._failed = 0
+        self._opened_at = None
+        self._trial_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            # A trial that never reported back (e.g. it was shed) is replaced after another cooldown
+            trial_free = self._trial_at is None or now - self._trial_at >= self.cooldown
+            if trial_free and now - self._opened_at >= self.cooldown:
+                self._trial_at = now
+                return True
+            return False
+
+    def retry_after(self) -> int:
+        with self._lock:
+            if self._opened_at is None:
+                return 1
+            return max(1, round(self.cooldown - (time.monotonic() - self._opened_at)))
+
+    def record_success(self):
+        with self._lock:
+            self._failed = 0
+            self._opened_at = None
+            self._trial_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failed += 1
+            if self._failed >= self.failures:
+                if self._opened_at is None:
+                    print(f"LLM circuit opened after {self._failed} consecutive failures")
+                self._opened_at = time.monotonic()
+                self._trial_at = None
+
+class _Role:
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker()
+
+_roles = {}
+_roles_lock = threading.Lock()
+_budget = RetryBudget()
+# Attempts (hedges included) run here, so a caller can stop waiting at its
+# deadline; an abandoned attempt ends with its request's own timeout
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY * 2, thread_name_prefix="llm")
+
+# Monotonic time by which every LLM call of the current task must end, see llm_deadline
+_task_deadline: ContextVar[Optional[float]] = ContextVar("llm_task_deadline", default=None)
+
+@contextmanager
+def llm_deadline(seconds: float):
+    """
+    Ends every call_llm made inside the block by `seconds` from now, however
+    long the roles' own deadlines are; calls made after it has passed fail
+    at once. Nested blocks can only shorten the deadline.
+    """
+    deadline = time.monotonic() + seconds
+    outer = _task_deadline.get()
+    token = _task_deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _task_deadline.reset(token)
+
+def propagate_deadline(fn: Callable) -> Callable:
+    """Wraps fn to run under the caller's llm_deadline, e.g. when fn is handed to a thread pool"""
+    deadline = _task_deadline.get()
+    def run(*args, **kwargs):
+        token = _task_deadline.set(deadline)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _task_deadline.reset(token)
+    return run
+
+def _role(role: str) -> _Role:
+    with _roles_lock:
+        if role not in _roles:
+            _roles[role] = _Role()
+        return _roles[role]
+
+def _first_result(attempt: Callable[[], str], hedge_after: Optional[float], deadline: float) -> str:
+    """
+    Runs attempt, and a duplicate of it if the first is still running after
+    hedge_after seconds. Returns whichever succeeds first.
+    """
+    started = time.monotonic()
+    pending = {_executor.submit(attempt)}
+    error = None
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            raise TimeoutError("LLM call missed its deadline")
+        timeout = deadline - now
+        if hedge_after is not None:
+            timeout = min(timeout, max(0.0, started + hedge_after - now))
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        if hedge_after is not None and time.monotonic() >= started + hedge_after:
+            if pending and _budget.try_spend():
+                pending.add(_executor.submit(attempt))
+            hedge_after = None
+    raise error
+
+def _call(role: str, prompt: str, knowledge, agent_kwargs: dict) -> str:
+    policy = LLM_POLICIES.get(role, LLM_POLICIES['default'])
+    state = _role(role)
+    deadline = time.monotonic() + policy['deadline']
+    task_deadline = _task_deadline.get()
+    if task_deadline is not None:
+        if task_deadline <= time.monotonic():
+            raise LLMUnavailable(role)  # the task this call belongs to is out of time
+        deadline = min(deadline, task_deadline)
+    if not state.breaker.allow():
+        raise LLMUnavailable(role, state.breaker.retry_after())
+    _budget.record_call()
+
+    def attempt():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("LLM call missed its deadline")  # queued past its caller's deadline
+        with pooled_agent(role, knowledge, **agent_kwargs) as agent, llm_slot(min(LLM_QUEUE_TIMEOUT, remaining)):
+            if hasattr(agent.model, "request_timeout"):
+                agent.model.request_timeout = max(1.0, deadline - time.monotonic())
+            started = time.monotonic()
+            content = agent.run(prompt).content
+        state.latency.record(time.monotonic() - started)
+        return content
+
+    retries = 0
+    while True:
+        try:
+            content = _first_result(attempt, state.latency.quantile(0.95) if policy['hedge'] else None, deadline)
+            state.breaker.record_success()
+            return content
+        except LLMOverloaded:
+            raise  # shed locally, not the provider's fault
+        except Exception as e:
+            if deadline != task_deadline or time.monotonic() < deadline:
+                state.breaker.record_failure()  # running out of task time is not the provider's fault
+            backoff = random.uniform(0, LLM_RETRY_BACKOFF * 2 ** retries)
+            if (retries >= policy['retries'] or time.monotonic() + backoff >= deadline
+                    or not _budget.try_spend()):
+                if isinstance(e, TimeoutError):
+                    raise LLMUnavailable(role) from e
+                raise
+            print(f"Retrying {role} LLM call after error: {e}")
+            time.sleep(backoff)
+            retries += 1
+
+def call_llm(role: str, prompt: str, fallback: Optional[Callable[[], str]] = None, knowledge=None,
+             single_flight: bool = False, **agent_kwargs) -> RunResponse:
+    """
+    Runs prompt on a pooled agent for role, under the role's LLM_POLICIES
+    entry: the whole call, retries included, ends by its deadline, or by the
+    enclosing llm_deadline if that is sooner. If it
+    fails, is shed or the role's circuit is open, fallback() provides the
+    answer when given; otherwise the error (LLMOverloaded/LLMUnavailable for
+    capacity and deadline problems) is raised.
+
+    With single_flight, identical concurrent calls share one request; only
+    use it where the prompt fully determines the answer, i.e. without knowledge.
+    """
+    try:
+        if single_flight:
+            key = prompt_key(role, prompt, **agent_kwargs)
+            content = _single_flight.do(key, lambda: _call(role, prompt, knowledge, agent_kwargs))
+        else:
+            content = _call(role, prompt, knowledge, agent_kwargs)
+    except Exception as e:
+        if fallback is None:
+            raise
+        print(f"Using fallback for {role}: {e}")
+        content = fallback()
+    return RunResponse(content=content)
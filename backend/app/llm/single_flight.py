@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Optional
+from redis import Redis
+from redis.exceptions import RedisError
+
+# Also coalesce across API processes through Redis, not only within one
+SINGLE_FLIGHT_DISTRIBUTED = os.getenv("SINGLE_FLIGHT_DISTRIBUTED", "false").lower() == "true"
+# Longest a call may take before waiting processes stop waiting and run it themselves
+SINGLE_FLIGHT_LOCK_TTL = float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", "120"))
+# How long a finished result stays available to processes that were waiting for it
+SINGLE_FLIGHT_RESULT_TTL = int(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "30"))
+
+# Deletes the lock only if this caller still owns it
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers with the same
+    key wait for that call and share its result (or its exception).
+
+    With a Redis client the same holds across processes: the first process
+    takes a lock for the key, the others poll for the result it publishes.
+    Results must then be strings. If Redis is unreachable, or the lock holder
+    outlives lock_ttl, callers fall back to running the call themselves.
+    """
+    def __init__(self, redis: Optional[Redis] = None, lock_ttl: float = SINGLE_FLIGHT_LOCK_TTL,
+                 result_ttl: int = SINGLE_FLIGHT_RESULT_TTL, poll_interval: float = 0.1, prefix: str = "singleflight"):
+        self.redis = redis
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self._calls = {}  # key -> Future of the call in flight
+        self._lock = threading.Lock()
+        self._release = redis.register_script(RELEASE_LUA) if redis is not None else None
+
+    def do(self, key: str, func: Callable[[], str]) -> str:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._across_processes(key, func) if self.redis is not None else func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _across_processes(self, key: str, func: Callable[[], str]) -> str:
+        lock_key, result_key = f"{self.prefix}:{key}:lock", f"{self.prefix}:{key}:result"
+        deadline = time.monotonic() + self.lock_ttl
+        try:
+            while True:
+                result = self.redis.get(result_key)
+                if result is not None:
+                    return result
+                token = uuid.uuid4().hex
+                if self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)):
+                    break
+                if time.monotonic() > deadline:
+                    return func()
+                time.sleep(self.poll_interval)
+        except RedisError as e:
+            print(f"Single-flight unavailable for {key}: {e}")
+            return func()
+
+        try:
+            result = func()
+            self.redis.set(result_key, result, ex=self.result_ttl)
+            return result
+        finally:
+            try:
+                self._release(keys=[lock_key], args=[token])
+            except RedisError:
+                pass  # the lock expires on its own
+
+def prompt_key(role: str, prompt: str, **agent_kwargs) -> str:
+    """Hash of everything that determines a role's answer to prompt"""
+    from .providers import LLM_MODEL, LLM_PROVIDER
+    parts = [LLM_PROVIDER, LLM_MODEL, role, repr(sorted(agent_kwargs.items())), prompt]
+    return hashlib.sha256("\x1f".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+single_flight = SingleFlight(
+    Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379"), decode_responses=True)
+    if SINGLE_FLIGHT_DISTRIBUTED else None
+)
@@ -1,11 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.cases.routes import router as cases_router
 from app.websockets.routes import router as websocket_router
 from app.api.hai.routes import router as hai_router
 from app.api.consultancy.routes import router as consultancy_router
 from app.api.credits import routes as credit_routes
+from app.api.content_verification.worker import verification_worker
+from app.consultancy.consultancy import get_rag
+from app.llm.admission import LLMOverloaded
 import os
+import asyncio
 
 app = FastAPI()
 
@@ -18,6 +23,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloaded):
+    # Shed load instead of queueing behind a saturated LLM provider
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.on_event("startup")
+async def start_background_workers():
+    await verification_worker.start()
+    await credit_routes.credit_ledger.start()
+    await credit_routes.credit_rollups.start()
+    if os.getenv("CONSULTANCY_WARMUP", "true").lower() == "true":
+        # Load the consultancy index without holding up startup
+        app.state.consultancy_warmup = asyncio.create_task(asyncio.to_thread(get_rag))
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await verification_worker.stop()
+    await credit_routes.credit_ledger.stop()
+    await credit_routes.credit_rollups.stop()
+
 @app.get("/")
 async def root():
     return {"message": "Hello Lexions v1!"}
@@ -27,4 +56,17 @@ app.include_router(cases_router, prefix="/cases", tags=["cases"])
 app.include_router(websocket_router, tags=["websocket"])
 app.include_router(hai_router, prefix="/api/hai", tags=["hai"])
 app.include_router(consultancy_router, prefix="/consultancy", tags=["consultancy"])
-app.include_router(credit_routes.router, prefix="/api")
\ No newline at end of file
+app.include_router(credit_routes.router, prefix="/api")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile-startup", action="store_true", help="print import and model initialisation times, then exit")
+    parser.add_argument("--skip-init", action="store_true", help="with --profile-startup, only profile imports")
+    args = parser.parse_args()
+    if args.profile_startup:
+        from app.profiling import profile_startup
+        profile_startup(initialize=not args.skip_init)
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
@@ -0,0 +1,35 @@
+import argparse
+from dotenv import load_dotenv
+from .scoring import SCORE_MODEL_PATH, ScoreModel, load_audit_samples
+
+load_dotenv()
+
+def mean_absolute_error(model, features, targets):
+    return sum(abs(model.score(sample) - target) for sample, target in zip(features, targets)) / len(targets)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the local argument scorer to the LLM scores recorded by the score audit")
+    parser.add_argument("--out", default=SCORE_MODEL_PATH, help="Where to write the calibrated model")
+    parser.add_argument("--min-samples", type=int, default=50, help="Refuse to fit on fewer audit samples")
+    args = parser.parse_args()
+
+    from ..db.redis_db import redis_client
+    features, targets = load_audit_samples(redis_client.redis)
+    if len(targets) < args.min_samples:
+        parser.exit(1, f"Only {len(targets)} audit samples (need {args.min_samples}); run with SCORE_AUDIT_RATE > 0 to collect more\n")
+
+    # Every fifth sample is held out to compare the current and refitted models
+    train = [i for i in range(len(targets)) if i % 5]
+    held_out = [i for i in range(len(targets)) if not i % 5]
+    current = ScoreModel.load(args.out)
+    refitted = ScoreModel.fit([features[i] for i in train], [targets[i] for i in train])
+    held_out_features, held_out_targets = [features[i] for i in held_out], [targets[i] for i in held_out]
+    print(f"Held-out MAE against the LLM: current {mean_absolute_error(current, held_out_features, held_out_targets):.3f}, "
+          f"refitted {mean_absolute_error(refitted, held_out_features, held_out_targets):.3f}")
+
+    model = ScoreModel.fit(features, targets)
+    model.save(args.out)
+    print(f"Wrote a scorer calibrated on {len(targets)} samples to {args.out}: {model.weights}, bias {model.bias}")
+
+if __name__ == "__main__":
+    main()
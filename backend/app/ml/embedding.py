@@ -0,0 +1,106 @@
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List
+import numpy as np
+from .model_cache import get_embed_model
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
+# Most texts passed to the model in one forward pass
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+class EmbeddingService:
+    """
+    The process-wide sentence embedding model behind a batched API.
+
+    Calls from any thread are queued to one dedicated worker thread. The
+    worker merges whatever requests are waiting into batches of up to
+    batch_size texts, so the model runs one batch at a time however many
+    indexes, retrievers and verification jobs are embedding at once.
+    Vectors come back as unit-normalised float32 rows.
+    """
+    def __init__(self, model_name: str = EMBED_MODEL, batch_size: int = EMBED_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._requests = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queues texts for embedding and returns a future of their vectors"""
+        future = Future()
+        texts = list(texts)
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=f"embedding-{self.model_name}", daemon=True)
+                    self._worker.start()
+        self._requests.put((texts, future))
+        return future
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Returns a (len(texts), dim) array of unit-normalised embeddings"""
+        return self.submit(texts).result()
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        # MiniLM embeds queries and passages the same way
+        return self.embed([text])[0]
+
+    def _next_batch(self):
+        """Blocks for one request, then takes any others already waiting, up to batch_size texts"""
+        batch = [self._requests.get()]
+        size = len(batch[0][0])
+        while size < self.batch_size:
+            try:
+                request = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+        # Requests whose caller gave up are dropped
+        return [(texts, future) for texts, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                model = get_embed_model(self.model_name)
+                embeddings = []
+                for start in range(0, len(texts), self.batch_size):
+                    embeddings.extend(model.get_text_embedding_batch(texts[start:start + self.batch_size]))
+                vectors = np.asarray(embeddings, dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+_services = {}
+_services_lock = threading.Lock()
+
+def get_embedding_service(model_name: str = EMBED_MODEL) -> EmbeddingService:
+    """Returns the shared embedding service for model_name"""
+    service = _services.get(model_name)
+    if service is None:
+        with _services_lock:
+            service = _services.get(model_name)
+            if service is None:
+                service = EmbeddingService(model_name)
+                _services[model_name] = service
+    return service
@@ -0,0 +1,35 @@
+import threading
+
+# Process-wide cache of loaded transformers pipelines, keyed by (task, model)
+_pipelines = {}
+_lock = threading.Lock()
+
+def get_pipeline(task: str, model: str, **kwargs):
+    """Returns a shared pipeline, loading it on first use"""
+    key = (task, model)
+    pipe = _pipelines.get(key)
+    if pipe is None:
+        with _lock:
+            pipe = _pipelines.get(key)
+            if pipe is None:
+                from transformers import pipeline
+                pipe = pipeline(task, model=model, **kwargs)
+                _pipelines[key] = pipe
+    return pipe
+
+_embed_models = {}
+
+def get_embed_model(model_name: str = "all-MiniLM-L6-v2"):
+    """
+    Returns a shared HuggingFace embedding model, loading it on first use.
+    Application code embeds through app.ml.embedding.get_embedding_service().
+    """
+    embed_model = _embed_models.get(model_name)
+    if embed_model is None:
+        with _lock:
+            embed_model = _embed_models.get(model_name)
+            if embed_model is None:
+                from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+                embed_model = HuggingFaceEmbedding(model_name=model_name)
+                _embed_models[model_name] = embed_model
+    return embed_model
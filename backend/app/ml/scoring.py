@@ -0,0 +1,189 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# The calibrated scorer, written by `python -m app.ml.calibrate_scorer`
+SCORE_MODEL_PATH = os.getenv("SCORE_MODEL_PATH", "app/ml/score_model.json")
+# Share of turns also scored by the LLM, in the background, as calibration data
+SCORE_AUDIT_RATE = float(os.getenv("SCORE_AUDIT_RATE", "0"))
+# Audit samples kept in the score_audit stream
+SCORE_AUDIT_MAXLEN = int(os.getenv("SCORE_AUDIT_MAXLEN", "10000"))
+SCORE_AUDIT_STREAM = "score_audit"
+# Audits queued or running at once; sampled turns beyond it are not audited
+SCORE_AUDIT_MAX_PENDING = int(os.getenv("SCORE_AUDIT_MAX_PENDING", "8"))
+
+FEATURES = ["expression", "coherence", "evidence_overlap", "length"]
+# Used until a calibrated model exists: rewards confident, coherent arguments
+# that draw on the case material and are not one-liners
+DEFAULT_WEIGHTS = {"expression": 1.5, "coherence": 1.5, "evidence_overlap": 2.0, "length": 1.0}
+DEFAULT_BIAS = -3.0
+# Arguments longer than this (in words) get no further credit for length
+LENGTH_SATURATION = 400
+
+STOPWORDS = frozenset(
+    "the and for that with this from have has are was were will shall would should been being into "
+    "their there which what when where while about under over such than then them they these those "
+    "also only other upon your our its not but any all may can".split()
+)
+
+def _content_words(text: str) -> set:
+    return {word for word in re.findall(r"[a-z0-9]+", text.lower()) if len(word) > 2 and word not in STOPWORDS}
+
+def evidence_overlap(response: str, evidence: str) -> float:
+    """Share of the response's content words that also occur in the evidence"""
+    words = _content_words(response)
+    if not words or not evidence:
+        return 0.0
+    return len(words & _content_words(evidence)) / len(words)
+
+def length_score(text: str) -> float:
+    return min(1.0, math.log1p(len(text.split())) / math.log1p(LENGTH_SATURATION))
+
+def response_features(response: str, expression: float, coherence: float, evidence: str = "") -> Dict[str, float]:
+    return {
+        "expression": float(expression),
+        "coherence": float(coherence),
+        "evidence_overlap": evidence_overlap(response, evidence),
+        "length": length_score(response),
+    }
+
+class ScoreModel:
+    """
+    Logistic model over response features giving a score between 0 and 1.
+    It is calibrated offline against the LLM's scores of the same turns, so
+    it stands in for the LLM judge at the cost of a dot product.
+    """
+    def __init__(self, weights: Optional[Dict[str, float]] = None, bias: float = DEFAULT_BIAS, samples: int = 0):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.bias = bias
+        self.samples = samples  # audit samples it was calibrated on
+
+    def score(self, features: Dict[str, float]) -> float:
+        z = self.bias + sum(self.weights[name] * features[name] for name in FEATURES)
+        return round(1 / (1 + math.exp(-z)), 4)
+
+    @classmethod
+    def fit(cls, features: List[Dict[str, float]], targets: List[float], l2: float = 1e-3,
+            steps: int = 5000, learning_rate: float = 0.5) -> "ScoreModel":
+        """
+        Logistic regression on the LLM scores as soft targets. Full-batch
+        gradient descent from zero, so the same samples give the same model.
+        """
+        x = np.array([[sample[name] for name in FEATURES] for sample in features], dtype=np.float64)
+        y = np.clip(np.array(targets, dtype=np.float64), 0, 1)
+        weights, bias = np.zeros(len(FEATURES)), 0.0
+        for _ in range(steps):
+            error = 1 / (1 + np.exp(-(x @ weights + bias))) - y
+            weights -= learning_rate * (x.T @ error / len(y) + l2 * weights)
+            bias -= learning_rate * error.mean()
+        return cls(dict(zip(FEATURES, weights.round(6).tolist())), round(float(bias), 6), len(y))
+
+    def save(self, path: str = SCORE_MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"weights": self.weights, "bias": self.bias, "samples": self.samples}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = SCORE_MODEL_PATH) -> "ScoreModel":
+        """The calibrated model at path, or the default weights until there is one"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["weights"], data["bias"], data.get("samples", 0))
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_score_model() -> ScoreModel:
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = ScoreModel.load()
+    return _model
+
+def parse_score(text: str) -> Optional[float]:
+    """
+    The first number in an LLM reply; None if there is none or it is outside
+    [0, 1], as a reply like "8" is on some other scale and would poison calibration
+    """
+    match = re.search(r"-?\d*\.?\d+", text or "")
+    if not match:
+        return None
+    score = float(match.group())
+    return score if 0.0 <= score <= 1.0 else None
+
+class ScoreAuditor:
+    """
+    Sends a sample of scored turns to the LLM score_analyser in the
+    background and records its score next to the local one in the
+    score_audit stream, which calibrate_scorer fits on. The sample is chosen
+    by hashing the response, so it is reproducible. Turns never wait for it:
+    when max_pending audits are already queued or running (e.g. the LLM is
+    slow), further samples are dropped rather than queued.
+    """
+    def __init__(self, rate: float = SCORE_AUDIT_RATE, max_pending: int = SCORE_AUDIT_MAX_PENDING):
+        self.rate = rate
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="score-audit")
+        self._pending = threading.BoundedSemaphore(max_pending)
+
+    def sampled(self, response: str) -> bool:
+        if self.rate <= 0:
+            return False
+        digest = hashlib.sha1(response.encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "big") / 2 ** 32 < self.rate
+
+    def submit(self, response: str, features: Dict[str, float], score: float):
+        if not self.sampled(response):
+            return
+        if not self._pending.acquire(blocking=False):
+            print("Score audit backlog full, sample dropped")
+            return
+        try:
+            self._executor.submit(self._audit, response, features, score)
+        except Exception:
+            self._pending.release()
+            raise
+
+    def _audit(self, response: str, features: Dict[str, float], score: float):
+        from ..llm.resilience import call_llm
+        from ..db.redis_db import redis_client
+        prompt = (
+            "Rate the following courtroom argument with a score between 0 and 1 for its legal merit, "
+            "coherence and use of the evidence. If the argument is not that good or it is very bad then the score is low. "
+            "Make sure only the score in the form of numbers is given as output and nothing else."
+            f"\nArgument: {response}"
+        )
+        try:
+            reply = call_llm("score_analyser", prompt).content
+            llm_score = parse_score(reply)
+            if llm_score is None:
+                print(f"Score audit got no score between 0 and 1 back: {reply!r:.80}")
+                return
+            redis_client.redis.xadd(
+                SCORE_AUDIT_STREAM,
+                {"features": json.dumps(features), "local_score": score, "llm_score": llm_score},
+                maxlen=SCORE_AUDIT_MAXLEN,
+                approximate=True
+            )
+        except Exception as e:
+            print(f"Score audit failed: {e}")
+        finally:
+            self._pending.release()
+
+score_auditor = ScoreAuditor()
+
+def load_audit_samples(redis) -> Tuple[List[Dict[str, float]], List[float]]:
+    """(features, LLM score) of every recorded audit, oldest first"""
+    features, targets = [], []
+    for _, fields in redis.xrange(SCORE_AUDIT_STREAM):
+        features.append(json.loads(fields["features"]))
+        targets.append(float(fields["llm_score"]))
+    return features, targets
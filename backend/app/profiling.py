@@ -0,0 +1,89 @@
+"""
+Startup profile of the API.
+
+    python -m app.main --profile-startup
+
+Import times come from a fresh interpreter run with -X importtime, so they
+describe a cold start rather than whatever this process already imported.
+Initialisation times are then measured by calling each lazy accessor once,
+in the order a request would first need it.
+"""
+import os
+import subprocess
+import sys
+import time
+
+IMPORT_TARGET = "app.main"
+TOP_MODULES = 25
+
+def import_times(module: str = IMPORT_TARGET):
+    """
+    Imports module in a fresh interpreter and returns (total_seconds, rows),
+    rows being (module, self_seconds, cumulative_seconds) per imported module
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=backend_dir
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows, total = [], 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # the header line
+        name = fields[2].strip()
+        rows.append((name, self_us / 1e6, cumulative_us / 1e6))
+        if name == module:
+            total = cumulative_us / 1e6
+    return total, rows
+
+def _initializers():
+    from .ml.model_cache import get_pipeline
+    from .ml.embedding import get_embedding_service
+    from .api.content_verification.Agents.AITextDetector import DETECTOR_MODEL
+    from .human_ai.hai import SENTIMENT_MODEL, COHERENCE_MODEL
+    from .consultancy.consultancy import get_statute_retriever, get_rag
+    return [
+        ("embedding model", lambda: get_embedding_service().embed(["warm up"])),
+        ("statute index", get_statute_retriever),
+        ("consultancy agent", get_rag),
+        ("judge sentiment pipeline", lambda: get_pipeline("sentiment-analysis", SENTIMENT_MODEL)),
+        ("judge coherence pipeline", lambda: get_pipeline("text-classification", COHERENCE_MODEL)),
+        ("AI text detector", lambda: get_pipeline("text-classification", DETECTOR_MODEL)),
+    ]
+
+def profile_startup(module: str = IMPORT_TARGET, top: int = TOP_MODULES, initialize: bool = True):
+    """Prints the cold import time of module and the first-use cost of each lazy dependency"""
+    total, rows = import_times(module)
+    print(f"Cold import of {module}: {total:.2f}s ({len(rows)} modules)\n")
+
+    packages = {}
+    for name, self_seconds, _ in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_seconds
+    print(f"{'package':<40} {'self s':>8}")
+    for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:<40} {seconds:>8.3f}")
+
+    print(f"\n{'module':<60} {'self s':>8} {'cumul s':>8}")
+    for name, self_seconds, cumulative in sorted(rows, key=lambda row: -row[2])[:top]:
+        print(f"{name:<60} {self_seconds:>8.3f} {cumulative:>8.3f}")
+
+    if not initialize:
+        return
+    print(f"\n{'first use':<40} {'s':>8}")
+    for label, initializer in _initializers():
+        start = time.perf_counter()
+        try:
+            initializer()
+            outcome = ""
+        except Exception as e:
+            outcome = f"  failed: {e}"
+        print(f"{label:<40} {time.perf_counter() - start:>8.2f}{outcome}")
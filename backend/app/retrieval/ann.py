@@ -0,0 +1,162 @@
+import math
+import os
+import numpy as np
+
+# "auto" uses HNSW for float32 stores when hnswlib is installed, and IVF otherwise
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "auto")
+# Below this many vectors an exact scan is as fast as any ANN index
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "10000"))
+
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 picks 4 * sqrt(n)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "32"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+class FlatIndex:
+    """Exact inner product scan over every vector"""
+    name = "flat"
+
+    def search(self, vectors, query, k):
+        scores = vectors @ query
+        top = _top_k(scores, k)
+        return top, scores[top]
+
+    def save(self, path):
+        pass
+
+    @classmethod
+    def load(cls, path, vectors):
+        return cls()
+
+class IVFIndex:
+    """
+    Inverted file index: vectors are clustered with spherical k-means and a
+    query only scans the nprobe clusters whose centroids are closest to it.
+    nprobe trades recall for latency.
+    """
+    name = "ivf"
+
+    def __init__(self, centroids, order, offsets, nprobe=IVF_NPROBE):
+        self.centroids = centroids
+        self.order = order  # vector ids grouped by cluster
+        self.offsets = offsets  # cluster c owns order[offsets[c]:offsets[c + 1]]
+        self.nprobe = nprobe
+
+    @staticmethod
+    def _assign(vectors, centroids, batch_size=65536):
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            batch = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+            assignments[start:start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+        return assignments
+
+    @classmethod
+    def build(cls, vectors, nlist=IVF_NLIST, nprobe=IVF_NPROBE, iterations=10, sample_size=50000, seed=0):
+        n = len(vectors)
+        nlist = min(n, nlist or max(1, int(4 * math.sqrt(n))))
+        rng = np.random.default_rng(seed)
+
+        # Train the centroids on a sample, then assign every vector
+        sample = np.asarray(vectors[np.sort(rng.choice(n, min(n, max(sample_size, nlist * 40)), replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            filled = np.bincount(assignments, minlength=nlist) > 0
+            centroids[filled] = sums[filled] / (np.linalg.norm(sums[filled], axis=1, keepdims=True) + 1e-12)
+
+        assignments = cls._assign(vectors, centroids)
+        order = np.argsort(assignments, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))]).astype(np.int64)
+        return cls(centroids, order, offsets, nprobe)
+
+    def search(self, vectors, query, k):
+        probes = _top_k(self.centroids @ query, self.nprobe)
+        candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes])
+        candidates.sort()  # sequential reads from a memory-mapped matrix
+        scores = np.asarray(vectors[candidates]) @ query
+        top = _top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def save(self, path):
+        np.savez(os.path.join(path, "ivf.npz"), centroids=self.centroids, order=self.order, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path, vectors):
+        data = np.load(os.path.join(path, "ivf.npz"))
+        return cls(data["centroids"], data["order"], data["offsets"])
+
+class HNSWIndex:
+    """
+    Hierarchical navigable small world graph from hnswlib. m and
+    ef_construction set graph quality at build time, ef_search trades recall
+    for latency at query time. hnswlib keeps its own float32 copy of every
+    vector (plus the graph, about (4 * dim + 8 * m) bytes a vector), so
+    the matrix passed to search is ignored and should not be quantized.
+    """
+    name = "hnsw"
+
+    def __init__(self, index, ef_search=HNSW_EF_SEARCH):
+        self.index = index
+        self.ef_search = ef_search
+        # Set once: the index is shared by concurrent searches, and hnswlib
+        # already searches with max(ef, k) when a query asks for more
+        self.index.set_ef(ef_search)
+
+    @staticmethod
+    def available():
+        try:
+            import hnswlib
+            return True
+        except ImportError:
+            return False
+
+    @classmethod
+    def build(cls, vectors, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH):
+        import hnswlib
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        index.init_index(max_elements=len(vectors), M=m, ef_construction=ef_construction)
+        index.add_items(np.asarray(vectors, dtype=np.float32), np.arange(len(vectors)))
+        return cls(index, ef_search)
+
+    def search(self, vectors, query, k):
+        k = min(k, self.index.get_current_count())
+        labels, distances = self.index.knn_query(query, k=k)
+        # hnswlib's inner product distance is 1 - dot
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+    def save(self, path):
+        self.index.save_index(os.path.join(path, "hnsw.bin"))
+
+    @classmethod
+    def load(cls, path, vectors):
+        import hnswlib
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        index.load_index(os.path.join(path, "hnsw.bin"), max_elements=len(vectors))
+        return cls(index)
+
+BACKENDS = {index.name: index for index in (FlatIndex, IVFIndex, HNSWIndex)}
+
+def build_ann_index(vectors, backend=VECTOR_INDEX_BACKEND, min_vectors=ANN_MIN_VECTORS, quantized=False):
+    """
+    Builds the configured index, falling back to an exact scan for small
+    collections. For quantized stores "auto" picks IVF, which scans the
+    compact codes, since HNSW would hold a second float32 copy of them.
+    """
+    if backend == "flat" or len(vectors) < min_vectors:
+        return FlatIndex()
+    if backend == "auto":
+        backend = "hnsw" if HNSWIndex.available() and not quantized else "ivf"
+    return BACKENDS[backend].build(vectors)
+
+def load_ann_index(path, name, vectors):
+    return BACKENDS.get(name or "flat", FlatIndex).load(path, vectors)
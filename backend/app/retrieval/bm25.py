@@ -0,0 +1,56 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import List
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring"""
+    FILE = "bm25.json"
+
+    def __init__(self, postings: dict, doc_lengths: List[int], k1: float = 1.5, b: float = 0.75):
+        self.postings = postings  # term -> [[doc, term frequency], ...]
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, texts: List[str]):
+        postings, doc_lengths = {}, []
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append([doc, tf])
+        return cls(postings, doc_lengths)
+
+    def search(self, query: str, k: int):
+        """Returns [(doc, score)] for the k best matching documents"""
+        n = len(self.doc_lengths)
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc] / self.avg_length)
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+    def save(self, path: str):
+        with open(os.path.join(path, self.FILE), 'w', encoding='utf-8') as f:
+            json.dump({"postings": self.postings, "doc_lengths": self.doc_lengths, "k1": self.k1, "b": self.b}, f)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(os.path.join(path, cls.FILE), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data["postings"], data["doc_lengths"], data["k1"], data["b"])
@@ -0,0 +1,140 @@
+import json
+import os
+import re
+from typing import Dict, List
+
+# Act names as they are written in queries and judgments, mapped to a short code
+ACT_ALIASES = {
+    "ipc": "ipc",
+    "i.p.c": "ipc",
+    "i.p.c.": "ipc",
+    "indian penal code": "ipc",
+    "penal code": "ipc",
+    "crpc": "crpc",
+    "cr.p.c": "crpc",
+    "cr.p.c.": "crpc",
+    "code of criminal procedure": "crpc",
+    "evidence act": "iea",
+    "indian evidence act": "iea",
+    "constitution": "constitution",
+}
+
+# Corpus files whose numbered provisions belong to an act, matched on the file name
+DOCUMENT_ACTS = {
+    "constitution": ("article", "constitution"),
+    "penal": ("section", "ipc"),
+    "ipc": ("section", "ipc"),
+    "crpc": ("section", "crpc"),
+    "criminalprocedure": ("section", "crpc"),
+    "evidence": ("section", "iea"),
+}
+
+_ACT_PATTERN = "|".join(sorted((re.escape(alias) for alias in ACT_ALIASES), key=len, reverse=True))
+
+# A provision number with any sub-clauses, e.g. "304B" or "161(1)(a)"
+_NUMBER = r'\d{1,3}[A-Z]{0,3}(?:\s*\([0-9a-z]+\))*'
+_SEPARATOR = r'\s*(?:,|&|\band\b|\bto\b)\s*'
+
+# A reference may list several numbers, e.g. "Articles 14 and 21 of the
+# Constitution" or "Sections 302, 304B IPC"; the act applies to all of them
+REFERENCE_RE = re.compile(
+    r'\b(?P<kind>sections?|secs?\.?|s\.|u/s\.?|articles?|arts?\.?)\s*'
+    rf'(?P<numbers>{_NUMBER}(?:{_SEPARATOR}{_NUMBER})*)'
+    rf'(?:\s*(?:of\s+)?(?:the\s+)?(?P<act>{_ACT_PATTERN}))?',
+    re.IGNORECASE
+)
+LIST_ITEM_RE = re.compile(rf'(?:(?P<separator>,|&|\band\b|\bto\b)\s*)?(?P<number>\d{{1,3}}[A-Z]{{0,3}})', re.IGNORECASE)
+# Ranges such as "Sections 299 to 304" are expanded when they are at most this long
+MAX_RANGE = 20
+
+# Provision headings in bare acts, e.g. "302. Punishment for murder.—Whoever..."
+HEADING_RE = re.compile(r'^\s*(?P<number>\d{1,3}[A-Z]{0,3})\.\s+[A-Z][^\n]{2,200}?[—–]', re.MULTILINE)
+
+def _key(kind: str, number: str, act: str = None) -> str:
+    key = f"{kind}:{number.upper()}"
+    return f"{key}:{act}" if act else key
+
+def _numbers(listed: str) -> List[str]:
+    """The provision numbers in a list such as "302, 304B" or "299 to 304", sub-clauses dropped"""
+    numbers = []
+    # Sub-clause markers like "(1)" would read as numbers of their own
+    for item in LIST_ITEM_RE.finditer(re.sub(r'\([0-9a-z]+\)', '', listed, flags=re.IGNORECASE)):
+        number, separator = item.group("number"), (item.group("separator") or "").lower()
+        if separator == "to" and numbers and numbers[-1].isdigit() and number.isdigit() \
+                and 0 < int(number) - int(numbers[-1]) <= MAX_RANGE:
+            numbers.extend(str(n) for n in range(int(numbers[-1]) + 1, int(number)))
+        numbers.append(number)
+    return numbers
+
+def extract_references(text: str) -> List[str]:
+    """Returns normalised identifiers for every statute reference in text, e.g. "section:302:ipc" """
+    keys = []
+    for match in REFERENCE_RE.finditer(text):
+        kind = "article" if match.group("kind").lower().startswith("art") else "section"
+        act = ACT_ALIASES.get(match.group("act").lower()) if match.group("act") else None
+        if kind == "article" and act is None:
+            act = "constitution"
+        keys.extend(_key(kind, number, act) for number in _numbers(match.group("numbers")))
+    return list(dict.fromkeys(keys))
+
+def _document_act(file_name: str):
+    name = re.sub(r'[^a-z]', '', file_name.lower())
+    for keyword, act in DOCUMENT_ACTS.items():
+        if keyword in name:
+            return act
+    return None
+
+class CitationIndex:
+    """
+    Exact-match index from statute identifiers to corpus chunks.
+
+    "defines" maps an identifier to the chunks where the provision itself is
+    written (its heading in the bare act), "mentions" to chunks that refer to
+    it. Identifiers are stored with and without the act, so "Section 302"
+    and "Section 302 IPC" both resolve.
+    """
+    FILE = "citations.json"
+
+    def __init__(self, defines: Dict[str, List[int]], mentions: Dict[str, List[int]]):
+        self.defines = defines
+        self.mentions = mentions
+
+    @classmethod
+    def build(cls, nodes: List[dict]):
+        defines, mentions = {}, {}
+
+        def add(index, key, idx):
+            for k in {key, key.rsplit(":", 1)[0] if key.count(":") == 2 else key}:
+                postings = index.setdefault(k, [])
+                if not postings or postings[-1] != idx:
+                    postings.append(idx)
+
+        for idx, node in enumerate(nodes):
+            act = _document_act(node.get("metadata", {}).get("file_name", ""))
+            if act:
+                kind, code = act
+                for match in HEADING_RE.finditer(node["text"]):
+                    add(defines, _key(kind, match.group("number"), code), idx)
+            for key in extract_references(node["text"]):
+                add(mentions, key, idx)
+        return cls(defines, mentions)
+
+    def lookup(self, query: str, limit: int = 3) -> List[int]:
+        """Returns chunk indices for the statutes cited in query, definitions first"""
+        hits = []
+        for key in extract_references(query):
+            hits.extend(self.defines.get(key, [])[:limit])
+        if not hits:
+            for key in extract_references(query):
+                hits.extend(self.mentions.get(key, [])[:limit])
+        return list(dict.fromkeys(hits))
+
+    def save(self, path: str):
+        with open(os.path.join(path, self.FILE), 'w', encoding='utf-8') as f:
+            json.dump({"defines": self.defines, "mentions": self.mentions}, f)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(os.path.join(path, cls.FILE), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data["defines"], data["mentions"])
@@ -0,0 +1,35 @@
+from typing import List
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+class FederatedRetriever(BaseRetriever):
+    """
+    Queries a shared, process-wide statute index and a small per-case overlay
+    index, and merges the two result lists by reciprocal rank. Each node is
+    tagged with the index it came from in metadata["source"], and every
+    result returned is kept in `retrieved` so callers can reuse what a
+    request already fetched instead of searching again.
+    """
+    def __init__(self, shared, overlay, shared_top_k: int = 2, overlay_top_k: int = 2, rrf_k: int = 60):
+        super().__init__()
+        self.shared = shared
+        self.overlay = overlay
+        self.shared_top_k = shared_top_k
+        self.overlay_top_k = overlay_top_k
+        self.rrf_k = rrf_k
+        self.retrieved: List[NodeWithScore] = []
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        sources = [("case", self.overlay, self.overlay_top_k)]
+        if self.shared is not None:
+            sources.append(("statutes", self.shared, self.shared_top_k))
+
+        merged = []
+        for source, retriever, top_k in sources:
+            for rank, result in enumerate(retriever.retrieve(query_bundle)[:top_k], 1):
+                result.node.metadata["source"] = source
+                merged.append((1.0 / (self.rrf_k + rank), result))
+        merged.sort(key=lambda item: -item[0])
+        results = [result for _, result in merged]
+        self.retrieved.extend(results)
+        return results
@@ -0,0 +1,66 @@
+from typing import List
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+class StoreRetriever(BaseRetriever):
+    """llama_index retriever over a PersistedVectorStore"""
+    def __init__(self, store, embedder, similarity_top_k: int = 5):
+        super().__init__()
+        self.store = store
+        self.embedder = embedder
+        self.similarity_top_k = similarity_top_k
+
+    def _node(self, idx: int, score: float) -> NodeWithScore:
+        node = self.store.nodes[idx]
+        return NodeWithScore(
+            node=TextNode(id_=node["id"], text=node["text"], metadata=node.get("metadata", {})),
+            score=score
+        )
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        query_vector = self.embedder.embed_query(query_bundle.query_str)
+        return [self._node(idx, score) for idx, score in self.store.search_ids(query_vector, self.similarity_top_k)]
+
+class HybridRetriever(StoreRetriever):
+    """
+    Vector and BM25 retrieval fused by reciprocal rank, with an exact lookup
+    for statute citations. Queries that cite a provision ("Section 302 IPC",
+    "Article 21") get the chunks defining it straight from the citation
+    index, topped up to a smaller citation_top_k from the fused ranking.
+    """
+    def __init__(self, store, embedder, bm25=None, citations=None, similarity_top_k: int = 5,
+                 citation_top_k: int = 3, candidates: int = 50, rrf_k: int = 60):
+        super().__init__(store, embedder, similarity_top_k)
+        self.bm25 = bm25
+        self.citations = citations
+        self.citation_top_k = citation_top_k
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def _fuse(self, query: str):
+        rankings = [self.store.search_ids(self.embedder.embed_query(query), self.candidates)]
+        if self.bm25:
+            rankings.append(self.bm25.search(query, self.candidates))
+
+        scores = {}
+        for ranking in rankings:
+            for rank, (idx, _) in enumerate(ranking, 1):
+                scores[idx] = scores.get(idx, 0.0) + 1.0 / (self.rrf_k + rank)
+        # Scaled so that ranking first in every list scores 1
+        best = len(rankings) / (self.rrf_k + 1)
+        return sorted(((idx, score / best) for idx, score in scores.items()), key=lambda item: -item[1])
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        query = query_bundle.query_str
+        exact = self.citations.lookup(query) if self.citations else []
+        k = self.citation_top_k if exact else self.similarity_top_k
+
+        results = [(idx, 1.0) for idx in exact[:k]]
+        if len(results) < k:
+            seen = set(exact)
+            for idx, score in self._fuse(query):
+                if idx not in seen:
+                    results.append((idx, score))
+                    if len(results) == k:
+                        break
+        return [self._node(idx, score) for idx, score in results]
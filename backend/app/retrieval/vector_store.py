@@ -0,0 +1,240 @@
+import json
+import os
+import numpy as np
+from typing import List
+from .ann import FlatIndex, HNSWIndex, VECTOR_INDEX_BACKEND, build_ann_index, load_ann_index
+
+# "int8", "float16" or "none"
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8")
+# Candidates fetched per requested result and rescored at full precision
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+class QuantizedMatrix:
+    """
+    Row-major matrix of embeddings stored as float16, or as int8 with one
+    float32 scale per row. Supports the two operations the ANN indexes need,
+    matrix-vector products and row lookups, without materialising a float32
+    copy of the whole matrix.
+    """
+    BLOCK_ROWS = 65536
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray = None):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def quantize(cls, vectors, dtype: str):
+        if dtype == "float16":
+            return cls(np.ascontiguousarray(vectors, dtype=np.float16))
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        scales = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), cls.BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + cls.BLOCK_ROWS], dtype=np.float32)
+            block_scales = np.abs(block).max(axis=1) / 127.0 + 1e-12
+            codes[start:start + len(block)] = np.round(block / block_scales[:, None])
+            scales[start:start + len(block)] = block_scales
+        return cls(codes, scales)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        block = self.codes[rows].astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[rows][..., None]
+        return block
+
+    def __matmul__(self, query):
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), self.BLOCK_ROWS):
+            scores[start:start + self.BLOCK_ROWS] = self.codes[start:start + self.BLOCK_ROWS].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+class NodeBlob:
+    """
+    Node dicts serialised back to back as UTF-8 JSON, located by an offsets
+    array. Loaded from disk the blob is memory-mapped, so node text costs no
+    resident memory until a node is actually returned.
+    """
+    DATA_FILE = "nodes.bin"
+    OFFSETS_FILE = "node_offsets.npy"
+
+    def __init__(self, data, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_nodes(cls, nodes: List[dict]):
+        records = [json.dumps(node).encode('utf-8') for node in nodes]
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(record) for record in records])
+        return cls(b"".join(records), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> dict:
+        return json.loads(bytes(self.data[self.offsets[idx]:self.offsets[idx + 1]]))
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
+    def save(self, path: str):
+        with open(os.path.join(path, self.DATA_FILE), 'wb') as f:
+            f.write(bytes(self.data))
+        np.save(os.path.join(path, self.OFFSETS_FILE), self.offsets)
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, cls.DATA_FILE))
+
+    @classmethod
+    def load(cls, path: str):
+        offsets = np.load(os.path.join(path, cls.OFFSETS_FILE))
+        if offsets[-1] == 0:
+            return cls(b"", offsets)
+        return cls(np.memmap(os.path.join(path, cls.DATA_FILE), dtype=np.uint8, mode='r'), offsets)
+
+class PersistedVectorStore:
+    """
+    Vector store that lives on disk.
+
+    Unit-normalised float32 embeddings are saved as a .npy file and memory-mapped
+    on load, so opening an index costs no embedding work and pages are shared
+    between worker processes. Searches run against a compact quantized copy
+    held in memory (see QuantizedMatrix) through a pluggable nearest neighbour
+    index (see ann.py), and the best candidates are rescored against the
+    float32 vectors. Node text and metadata live in a NodeBlob.
+    """
+    VECTORS_FILE = "vectors.npy"
+    CODES_FILE = "vector_codes.npy"
+    SCALES_FILE = "vector_scales.npy"
+    NODES_FILE = "nodes.json"  # indexes written before NodeBlob
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, vectors, nodes, manifest: dict = None, ann=None, full_vectors: np.ndarray = None):
+        self.vectors = vectors  # what the ANN index scans, quantized or float32
+        self.full_vectors = full_vectors  # float32 rows for rescoring, None to skip it
+        self.nodes = nodes
+        self.manifest = manifest or {}
+        self.ann = ann or FlatIndex()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray, nodes, manifest: dict = None, ann_backend: str = VECTOR_INDEX_BACKEND,
+                     quantization: str = VECTOR_QUANTIZATION, keep_full_precision: bool = True):
+        ann = build_ann_index(vectors, ann_backend, quantized=quantization != "none")
+        if quantization == "none" or ann.name == HNSWIndex.name:
+            # HNSW searches its own float32 copy, so a quantized one would only add memory
+            return cls(vectors, nodes, manifest, ann, vectors)
+        return cls(
+            QuantizedMatrix.quantize(vectors, quantization),
+            nodes,
+            dict(manifest or {}, quantization=quantization),
+            ann,
+            vectors if keep_full_precision else None
+        )
+
+    @classmethod
+    def build(cls, nodes: List[dict], embedder, batch_size: int = 1024, manifest: dict = None,
+              ann_backend: str = VECTOR_INDEX_BACKEND, quantization: str = VECTOR_QUANTIZATION, keep_full_precision: bool = True):
+        """
+        Embeds nodes ({"id", "text", "metadata"}) with an EmbeddingService and
+        returns a store holding them. Stores that are never saved can pass
+        keep_full_precision=False to drop the float32 vectors and skip rescoring.
+        """
+        blocks = [
+            embedder.embed([node["text"] for node in nodes[start:start + batch_size]])
+            for start in range(0, len(nodes), batch_size)
+        ]
+        vectors = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+        return cls.from_vectors(vectors, NodeBlob.from_nodes(nodes), manifest, ann_backend, quantization, keep_full_precision)
+
+    def save(self, path: str):
+        if self.full_vectors is None:
+            raise ValueError("Only stores built with keep_full_precision can be saved")
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, self.VECTORS_FILE), np.asarray(self.full_vectors, dtype=np.float32))
+        if isinstance(self.vectors, QuantizedMatrix):
+            np.save(os.path.join(path, self.CODES_FILE), self.vectors.codes)
+            if self.vectors.scales is not None:
+                np.save(os.path.join(path, self.SCALES_FILE), self.vectors.scales)
+        nodes = self.nodes if isinstance(self.nodes, NodeBlob) else NodeBlob.from_nodes(self.nodes)
+        nodes.save(path)
+        self.ann.save(path)
+        manifest = dict(self.manifest, count=len(self.nodes), dim=int(self.vectors.shape[1]), ann=self.ann.name)
+        with open(os.path.join(path, self.MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, cls.MANIFEST_FILE))
+
+    @classmethod
+    def load(cls, path: str):
+        full_vectors = np.load(os.path.join(path, cls.VECTORS_FILE), mmap_mode='r')
+        with open(os.path.join(path, cls.MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        if NodeBlob.exists(path):
+            nodes = NodeBlob.load(path)
+        else:
+            with open(os.path.join(path, cls.NODES_FILE), 'r', encoding='utf-8') as f:
+                nodes = NodeBlob.from_nodes(json.load(f))
+
+        quantization = manifest.get("quantization", "none")
+        if quantization == "none" or manifest.get("ann") == HNSWIndex.name:
+            vectors = full_vectors
+        elif os.path.exists(os.path.join(path, cls.CODES_FILE)):
+            scales_path = os.path.join(path, cls.SCALES_FILE)
+            vectors = QuantizedMatrix(
+                np.load(os.path.join(path, cls.CODES_FILE)),
+                np.load(scales_path) if os.path.exists(scales_path) else None
+            )
+        else:
+            vectors = QuantizedMatrix.quantize(full_vectors, quantization)
+
+        return cls(vectors, nodes, manifest, load_ann_index(path, manifest.get("ann"), vectors), full_vectors)
+
+    def search_ids(self, query_vector, k: int):
+        """Returns [(position, score)] for the k vectors most similar to query_vector"""
+        if not len(self.nodes):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-12)
+
+        if self.full_vectors is None or self.vectors is self.full_vectors:
+            ids, scores = self.ann.search(self.vectors, query, k)
+            return [(int(i), float(score)) for i, score in zip(ids, scores)]
+
+        # Approximate candidates from the compact copy, exact scores for the final order
+        ids, _ = self.ann.search(self.vectors, query, k * VECTOR_RESCORE_FACTOR)
+        ids = np.sort(ids)
+        scores = np.asarray(self.full_vectors[ids], dtype=np.float32) @ query
+        order = np.argsort(-scores)[:k]
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+    def search(self, query_vector, k: int):
+        """Returns [(node, score)] for the k nodes most similar to query_vector"""
+        return [(self.nodes[i], score) for i, score in self.search_ids(query_vector, k)]
+
+def documents_to_nodes(documents, chunk_size: int, chunk_overlap: int) -> List[dict]:
+    """Chunks llama_index documents into the node dicts stored by PersistedVectorStore"""
+    from llama_index.core.node_parser import SentenceSplitter
+    splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [
+        {"id": node.node_id, "text": node.get_content(), "metadata": node.metadata}
+        for node in splitter.get_nodes_from_documents(documents)
+    ]
@@ -2,6 +2,8 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
 from .connection_manager import manager
 from ..schema.schemas import ChatMessageSchema
 from ..human_ai.hai import Judge, ProcessInputRequest
+from ..api.rate_limit import caller_id, check_rate_limit
+from ..llm.admission import LLMOverloaded
 import json
 from pydantic import ValidationError
 import asyncio
@@ -126,6 +128,16 @@ async def hai_websocket_endpoint(websocket: WebSocket, case_id: str, user_addres
                     data = await websocket.receive_json()
                     
                     if data["type"] == "human_input":
+                        # Each turn costs several LLM calls, so it draws from the same kind of buckets as the HTTP routes
+                        allowed, retry_after = await check_rate_limit("hai_websocket_turn", caller_id(websocket))
+                        if not allowed:
+                            await websocket.send_json({
+                                "type": "error",
+                                "content": f"Too many requests, retry in {retry_after}s",
+                                "retry_after": retry_after
+                            })
+                            continue
+
                         # Process human input and get response
                         human_response = await judge.process_input(ProcessInputRequest(
                             turn_type="human",
@@ -154,6 +166,12 @@ async def hai_websocket_endpoint(websocket: WebSocket, case_id: str, user_addres
                                 "data": ai_response.dict()
                             })
                     
+                except LLMOverloaded as e:
+                    await websocket.send_json({
+                        "type": "error",
+                        "content": str(e),
+                        "retry_after": e.retry_after
+                    })
                 except WebSocketDisconnect:
                     manager.disconnect(websocket, case_id)
                     break